@@ -0,0 +1,66 @@
+"""
+Tests for building commands from a configuration file in `tutgen.main`.
+"""
+
+# Third-party imports
+import pytest
+
+# Project imports
+from tutgen.browser_interaction import BrowserInteraction, BrowserInteractionBatch
+from tutgen.main import BuildContext, build_commands
+from tutgen.process_management import (
+    BatchExecuteSubshellCommand,
+    ExecuteSubshellCommand,
+)
+
+CONTEXT = BuildContext(intro_code="", outro_code="", use_cache=False)
+
+
+def subshell_entry(command: str, name: str = "server", **kwargs):
+    return {
+        "type": "ExecuteSubshell",
+        "subshell_name": name,
+        "command": command,
+        **kwargs,
+    }
+
+
+def test_subshell_commands_are_only_merged_when_batched():
+    commands = build_commands(
+        [
+            subshell_entry("a"),
+            subshell_entry("b"),
+            subshell_entry("c", batch=True),
+            subshell_entry("d", batch=True),
+            subshell_entry("e", name="client", batch=True),
+        ],
+        CONTEXT,
+    )
+
+    assert [type(command) for command in commands] == [
+        ExecuteSubshellCommand,
+        ExecuteSubshellCommand,
+        BatchExecuteSubshellCommand,
+        BatchExecuteSubshellCommand,
+    ]
+    assert commands[2].commands == [("c", None), ("d", None)]
+    assert commands[3].commands == [("e", None)]
+
+
+def test_adjacent_browser_interactions_are_batched():
+    interaction = {"type": "BrowserInteraction", "url": "http://localhost/", "text": ""}
+    commands = build_commands(
+        [interaction, interaction, interaction, subshell_entry("a"), interaction],
+        CONTEXT,
+    )
+
+    assert isinstance(commands[0], BrowserInteractionBatch)
+    assert len(commands[0].interactions) == 3
+    assert isinstance(commands[2], BrowserInteraction)
+
+
+def test_invalid_commands_are_rejected_before_building():
+    with pytest.raises(ValueError, match="unknown type"):
+        build_commands([subshell_entry("a"), {"type": "Unknown"}], CONTEXT)
+    with pytest.raises(ValueError, match="missing the key"):
+        build_commands([{"type": "StartSubshell"}], CONTEXT)
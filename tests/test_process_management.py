@@ -0,0 +1,71 @@
+"""
+Tests for running batched commands in a subshell with `tutgen.process_management`.
+"""
+
+# First-party imports
+import subprocess
+
+# Third-party imports
+import pytest
+
+# Project imports
+from tutgen.process_management import (
+    BatchExecuteSubshellCommand,
+    ExecuteSubshellCommand,
+    StartSubshell,
+    SubshellManager,
+    TerminateSubshell,
+)
+
+LABEL = "tutgen_test_subshell"
+TIMEOUT = 5  # Seconds to wait for each command
+
+
+@pytest.fixture(name="subshell")
+def fixture_subshell():
+    """
+    Start a subshell for the test and terminate it afterwards.
+    """
+    StartSubshell(LABEL).execute()
+    try:
+        yield SubshellManager().get_subshell(LABEL)
+    finally:
+        TerminateSubshell(LABEL).execute()
+
+
+def test_batch_waits_for_expected_output(subshell):
+    BatchExecuteSubshellCommand(
+        LABEL,
+        [("greeting=hello", None), ('echo "$greeting world"', "hello world")],
+        check=True,
+        timeout=TIMEOUT,
+    ).execute()
+
+    # The batch has finished, so the subshell is ready for the next command
+    ExecuteSubshellCommand(LABEL, "echo $greeting", expect="hello").execute()
+    assert subshell.isalive()
+
+
+def test_batch_raises_for_the_first_failed_command(subshell):
+    with pytest.raises(subprocess.CalledProcessError) as error:
+        BatchExecuteSubshellCommand(
+            LABEL,
+            [("true", None), ("(exit 3)", None), ("(exit 4)", None)],
+            check=True,
+            timeout=TIMEOUT,
+        ).execute()
+
+    assert error.value.returncode == 3
+    assert error.value.cmd == "(exit 3)"
+    # The rest of the batch ran before the error was raised
+    ExecuteSubshellCommand(LABEL, "echo ready", expect="ready").execute()
+    assert subshell.isalive()
+
+
+def test_batch_ignores_failures_without_check(subshell):
+    BatchExecuteSubshellCommand(
+        LABEL, [("false", None), ("echo done", "done")], timeout=TIMEOUT
+    ).execute()
+
+    assert subshell.isalive()
+
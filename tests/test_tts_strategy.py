@@ -0,0 +1,101 @@
+"""
+Tests for the narration cache in `tutgen.tts_strategy`.
+"""
+
+# First-party imports
+import os
+import tempfile
+
+# Project imports
+from tutgen.tts_strategy import CachedTTSStrategy, TTSStrategy
+
+
+class FakeStrategy(TTSStrategy):
+    """
+    A strategy that writes the text as the MP3 file and counts its calls.
+    """
+
+    def __init__(self, voice: str = "default"):
+        self.voice_params = {"voice": voice}
+        self.calls = 0
+
+    def generate_audio(self, text):
+        raise NotImplementedError
+
+    def generate_audio_file(self, text: str) -> str:
+        self.calls += 1
+        with tempfile.NamedTemporaryFile(suffix=".mp3", delete=False) as mp3_file:
+            mp3_file.write(text.encode("utf-8"))
+        return mp3_file.name
+
+
+def test_cache_path_depends_on_strategy_voice_and_text(tmp_path):
+    cache_dir = str(tmp_path)
+    cached = CachedTTSStrategy(FakeStrategy(), cache_dir=cache_dir)
+
+    assert cached.cache_path("hello") == cached.cache_path("hello")
+    assert cached.cache_path("hello") != cached.cache_path("hello!")
+    assert os.path.dirname(cached.cache_path("hello")) == cache_dir
+    assert cached.cache_path("hello") != CachedTTSStrategy(
+        FakeStrategy(voice="other"), cache_dir=cache_dir
+    ).cache_path("hello")
+
+
+def test_generate_audio_file_is_cached(tmp_path):
+    strategy = FakeStrategy()
+    cached = CachedTTSStrategy(strategy, cache_dir=str(tmp_path / "tts"))
+
+    path = cached.generate_audio_file("hello")
+
+    assert path == cached.cache_path("hello")
+    with open(path, "rb") as mp3_file:
+        assert mp3_file.read() == b"hello"
+    assert cached.generate_audio_file("hello") == path
+    assert strategy.calls == 1
+
+
+def test_generate_audio_file_replaces_staged_file_atomically(tmp_path, monkeypatch):
+    cache_dir = str(tmp_path / "tts")
+    cached = CachedTTSStrategy(FakeStrategy(), cache_dir=cache_dir)
+    replaced = []
+    replace = os.replace
+
+    def record_replace(src, dst):
+        replaced.append((src, dst))
+        replace(src, dst)
+
+    monkeypatch.setattr("tutgen.tts_strategy.os.replace", record_replace)
+    path = cached.generate_audio_file("hello")
+
+    [(staged_path, final_path)] = replaced
+    assert final_path == path
+    assert os.path.dirname(staged_path) == cache_dir
+    assert staged_path.endswith(".part")
+    assert os.listdir(cache_dir) == [os.path.basename(path)]
+
+
+def test_invalidate_text_removes_only_its_audio(tmp_path):
+    strategy = FakeStrategy()
+    cached = CachedTTSStrategy(strategy, cache_dir=str(tmp_path))
+    hello_path = cached.generate_audio_file("hello")
+    world_path = cached.generate_audio_file("world")
+
+    cached.invalidate("hello")
+
+    assert not os.path.exists(hello_path)
+    assert os.path.exists(world_path)
+    cached.generate_audio_file("hello")
+    assert strategy.calls == 3
+
+
+def test_invalidate_removes_only_the_cache_dir(tmp_path):
+    cache_dir = tmp_path / "tts"
+    other_file = tmp_path / "template.py"
+    other_file.write_text("", encoding="utf-8")
+    cached = CachedTTSStrategy(FakeStrategy(), cache_dir=str(cache_dir))
+    cached.generate_audio_file("hello")
+
+    cached.invalidate()
+
+    assert not cache_dir.exists()
+    assert other_file.exists()
@@ -0,0 +1,132 @@
+"""
+Tests for ordering and narration prefetching in `tutgen.video_invoker`.
+"""
+
+# First-party imports
+import threading
+from typing import List, Tuple
+
+# Third-party imports
+import pytest
+
+# Project imports
+from tutgen.command import ClipCommand, Command
+from tutgen.video_invoker import NarrationPrefetcher, VideoInvoker
+
+TIMEOUT = 5  # Seconds to wait for the prefetch thread
+
+
+class FakeClipCommand(ClipCommand):
+    """
+    A clip command that adds a named clip and records when it runs.
+    """
+
+    def __init__(self, name: str, events: List[Tuple[str, str]]):
+        super().__init__()
+        self.name = name
+        self.events = events
+        self.prefetched = threading.Event()
+
+    def prefetch_narration(self):
+        self.events.append(("prefetch", self.name))
+        self.prefetched.set()
+
+    def execute(self):
+        self.events.append(("execute", self.name))
+        assert self.receiver, "Receiver is None"
+        self.receiver.add_clip(self.name)
+
+
+class FakeCommand(Command):
+    """
+    A command that records when it runs, and optionally fails.
+    """
+
+    def __init__(self, name: str, events: List[Tuple[str, str]], fail: bool = False):
+        self.name = name
+        self.events = events
+        self.fail = fail
+
+    def execute(self):
+        self.events.append(("execute", self.name))
+        if self.fail:
+            raise RuntimeError(self.name)
+
+
+def test_execute_commands_keeps_clip_order():
+    events: List[Tuple[str, str]] = []
+    commands = [
+        FakeClipCommand("a", events),
+        FakeCommand("start", events),
+        FakeClipCommand("b", events),
+        FakeClipCommand("c", events),
+    ]
+    invoker = VideoInvoker()
+
+    invoker.execute_commands(commands)
+
+    assert invoker.video_receiver.clips == ["a", "b", "c"]
+    executed = [name for event, name in events if event == "execute"]
+    assert executed == ["a", "start", "b", "c"]
+
+
+def test_execute_commands_never_prefetches_after_execution():
+    events: List[Tuple[str, str]] = []
+    commands = [FakeClipCommand(name, events) for name in "abcdef"]
+
+    VideoInvoker().execute_commands(commands, prefetch_depth=2)
+
+    for command in commands:
+        if ("prefetch", command.name) in events:
+            assert events.index(("prefetch", command.name)) < events.index(
+                ("execute", command.name)
+            )
+
+
+def test_execute_commands_stops_at_first_failure():
+    events: List[Tuple[str, str]] = []
+    commands = [
+        FakeClipCommand("a", events),
+        FakeCommand("fail", events, fail=True),
+        FakeClipCommand("b", events),
+    ]
+    invoker = VideoInvoker()
+
+    with pytest.raises(RuntimeError, match="fail"):
+        invoker.execute_commands(commands)
+
+    assert ("execute", "b") not in events
+    assert invoker.video_receiver.clips == ["a"]
+
+
+def test_prefetcher_stays_within_depth():
+    events: List[Tuple[str, str]] = []
+    commands = [FakeClipCommand(name, events) for name in "abc"]
+    prefetcher = NarrationPrefetcher(commands, depth=2)
+
+    prefetcher.start()
+    try:
+        assert commands[1].prefetched.wait(TIMEOUT)
+        assert not commands[2].prefetched.wait(0.2)
+
+        prefetcher.command_started(commands[0])
+        assert commands[2].prefetched.wait(TIMEOUT)
+    finally:
+        prefetcher.stop()
+
+    assert events == [("prefetch", "a"), ("prefetch", "b"), ("prefetch", "c")]
+
+
+def test_prefetcher_skips_started_commands():
+    events: List[Tuple[str, str]] = []
+    commands = [FakeClipCommand(name, events) for name in "ab"]
+    prefetcher = NarrationPrefetcher(commands, depth=1)
+
+    prefetcher.command_started(commands[0])
+    prefetcher.start()
+    try:
+        assert commands[1].prefetched.wait(TIMEOUT)
+    finally:
+        prefetcher.stop()
+
+    assert events == [("prefetch", "b")]
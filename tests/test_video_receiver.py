@@ -0,0 +1,126 @@
+"""
+Tests for conforming clip formats in `tutgen.video_receiver`.
+"""
+
+# First-party imports
+from concurrent.futures import ThreadPoolExecutor
+from fractions import Fraction
+from typing import Dict, List, Tuple
+
+# Third-party imports
+import pytest
+
+# Project imports
+from tutgen import video_receiver
+from tutgen.video_receiver import (
+    AudioFormat,
+    ClipFormat,
+    PreparedClip,
+    VideoFormat,
+    VideoReceiver,
+)
+
+MUXED_AUDIO = AudioFormat("aac", 44100, 2)
+
+
+def clip_format(
+    width: int = 1920,
+    height: int = 1080,
+    extradata: bytes = b"tutgen",
+    audio: AudioFormat = MUXED_AUDIO,
+) -> ClipFormat:
+    """
+    Build the format of an H.264 clip.
+    """
+    return ClipFormat(
+        VideoFormat("h264", width, height, "yuv420p", "High", Fraction(25), extradata),
+        audio,
+    )
+
+
+class FakeEncoder:
+    """
+    Stands in for `probe_format` and `encode_clip`, recording the encoded clips.
+    """
+
+    def __init__(self, formats: Dict[str, ClipFormat]):
+        self.formats = formats
+        self.encoded: List[Tuple[str, int, int, bool]] = []
+
+    def probe_format(self, clip_path: str) -> ClipFormat:
+        return self.formats[clip_path]
+
+    def encode_clip(self, clip_path, width, height, output_dir=None, copy_video=False):
+        self.encoded.append((clip_path, width, height, copy_video))
+        encoded_path = f"{clip_path}.encoded"
+        self.formats[encoded_path] = clip_format(width, height)
+        return encoded_path
+
+
+@pytest.fixture(name="encoder")
+def fixture_encoder(monkeypatch):
+    """
+    Replace the probing and encoding of clips with a FakeEncoder.
+    """
+    encoder = FakeEncoder({})
+    monkeypatch.setattr(video_receiver, "probe_format", encoder.probe_format)
+    monkeypatch.setattr(video_receiver, "encode_clip", encoder.encode_clip)
+    return encoder
+
+
+def conform(clips: List[PreparedClip]) -> List[str]:
+    with ThreadPoolExecutor() as executor:
+        return VideoReceiver().conform_clips(executor, clips)
+
+
+def test_matching_clips_are_not_encoded(encoder):
+    encoder.formats.update(a=clip_format(), b=clip_format())
+
+    clip_paths = conform([PreparedClip("a", True, 1.0), PreparedClip("b", False, 1.0)])
+
+    assert clip_paths == ["a", "b"]
+    assert not encoder.encoded
+
+
+def test_clips_are_encoded_to_the_first_encoded_clip(encoder):
+    encoder.formats.update(
+        a=clip_format(extradata=b"recorded"),
+        b=clip_format(),
+        c=clip_format(1280, 720),
+    )
+
+    clip_paths = conform(
+        [
+            PreparedClip("a", False, 1.0),
+            PreparedClip("b", True, 1.0),
+            PreparedClip("c", True, 1.0),
+        ]
+    )
+
+    assert clip_paths == ["a.encoded", "b", "c.encoded"]
+    assert sorted(encoder.encoded) == [
+        ("a", 1920, 1080, False),
+        ("c", 1920, 1080, False),
+    ]
+
+
+def test_first_clip_is_encoded_without_an_encoded_clip_of_its_size(encoder):
+    encoder.formats.update(
+        a=clip_format(extradata=b"recorded"), b=clip_format(1280, 720)
+    )
+
+    clip_paths = conform([PreparedClip("a", False, 1.0), PreparedClip("b", True, 1.0)])
+
+    assert clip_paths == ["a.encoded", "b.encoded"]
+    assert encoder.encoded == [("a", 1920, 1080, False), ("b", 1920, 1080, False)]
+
+
+def test_clips_with_other_audio_only_have_their_audio_encoded(encoder):
+    encoder.formats.update(
+        a=clip_format(), b=clip_format(audio=AudioFormat("aac", 22050, 1))
+    )
+
+    clip_paths = conform([PreparedClip("a", True, 1.0), PreparedClip("b", False, 1.0)])
+
+    assert clip_paths == ["a", "b.encoded"]
+    assert encoder.encoded == [("b", 1920, 1080, True)]
@@ -27,24 +27,166 @@ Example:
     ```
 
 Note:
-    This script relies on external libraries such as MoviePy and Playwright, which
-    need to be installed to run the script successfully.
+    This script relies on external libraries such as MoviePy and Playwright and on
+    the external program ffmpeg, which need to be installed to run the script successfully.
+    Playwright is imported when the first browser is launched.
 
 Author:
     Roman Parise
 """
 
 # First-party imports
-from typing import Optional
-
-# Third-party imports
-from moviepy.editor import VideoFileClip
-from playwright.sync_api import sync_playwright, ViewportSize
+import asyncio
+import itertools
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    TypeVar,
+)
 
 # Project imports
-from .command import CreateClipCommand
-from .video_receiver import VideoReceiver
+from .command import ClipCommand, CreateClipCommand
+from .video_receiver import ClipFiles, VideoReceiver
 from .logging_manager import LoggingManager
+from .tts_strategy import MAX_TTS_WORKERS
+
+if TYPE_CHECKING:
+    from playwright.async_api import Browser, Playwright, ViewportSize
+
+T = TypeVar("T")
+# Numbers the HAR files of the recordings, so each context records to its own file
+HAR_COUNTER = itertools.count(1)
+
+
+@dataclass(frozen=True, slots=True)
+class Viewport:
+    """
+    The size of the browser viewport, which is also the size of the recorded video.
+
+    Args:
+        width (int): The width in pixels.
+        height (int): The height in pixels.
+
+    Raises:
+        ValueError: If the width or height is not a positive integer.
+    """
+
+    width: int
+    height: int
+
+    def __post_init__(self):
+        for name in ("width", "height"):
+            value = getattr(self, name)
+            if not isinstance(value, int) or value <= 0:
+                raise ValueError(
+                    f"Viewport {name} must be a positive integer, got {value!r}"
+                )
+
+    def to_viewport_size(self) -> "ViewportSize":
+        """
+        Convert the viewport to the dictionary form used by Playwright.
+
+        Returns:
+            ViewportSize: The viewport size.
+        """
+        return {"width": self.width, "height": self.height}
+
+
+class BrowserSession:
+    """
+    A headless Chromium browser driven by the async Playwright API, on an event loop
+    that runs in a background thread.
+
+    Recordings started from any thread run on the session's event loop, so every
+    browser interaction shares one Playwright driver and one browser. The browser is
+    launched on first use and runs until `close` is called, after which the next
+    recording launches it again.
+    """
+
+    def __init__(self) -> None:
+        self.logger = LoggingManager(__name__).logger
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._playwright: Optional["Playwright"] = None
+        self._browser: Optional["Browser"] = None
+        self._browser_lock = asyncio.Lock()  # Replaced with each new event loop
+
+    def run(self, record: Callable[["Browser"], Awaitable[T]]) -> T:
+        """
+        Run a recording on the session's browser and wait for its result.
+
+        Args:
+            record (Callable[[Browser], Awaitable[T]]): A coroutine function that
+                records with the browser it is given.
+
+        Returns:
+            T: The result of the recording.
+        """
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._browser_lock = asyncio.Lock()
+                self._thread = threading.Thread(
+                    target=self._loop.run_forever, name="tutgen_browser", daemon=True
+                )
+                self._thread.start()
+            loop = self._loop
+        return asyncio.run_coroutine_threadsafe(self._record(record), loop).result()
+
+    def close(self) -> None:
+        """
+        Close the browser, stop the Playwright driver and stop the event loop. Does
+        nothing if the session is not running.
+        """
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            if loop is None or thread is None:
+                return
+            try:
+                asyncio.run_coroutine_threadsafe(self._close(), loop).result()
+            finally:
+                loop.call_soon_threadsafe(loop.stop)
+                thread.join()
+                loop.close()
+                self._loop = self._thread = None
+
+    async def _record(self, record: Callable[["Browser"], Awaitable[T]]) -> T:
+        async with self._browser_lock:
+            if self._browser is None:
+                # pylint: disable-next=import-outside-toplevel
+                from playwright.async_api import async_playwright
+
+                self._playwright = await async_playwright().start()
+                self._browser = await self._playwright.chromium.launch(headless=True)
+                self.logger.debug("Browser started.")
+        return await record(self._browser)
+
+    async def _close(self) -> None:
+        async with self._browser_lock:
+            try:
+                if self._browser is not None:
+                    await self._browser.close()
+                    self.logger.debug("Browser closed.")
+            finally:
+                self._browser = None
+                if self._playwright is not None:
+                    await self._playwright.stop()
+                    self._playwright = None
+
+
+# The session shared by browser interactions that are not given one
+BROWSER_SESSION = BrowserSession()
 
 
 class BrowserInteraction(CreateClipCommand):
@@ -54,8 +196,18 @@ class BrowserInteraction(CreateClipCommand):
     Args:
         url (str): The URL to navigate to.
         text (str): The text for narration.
-        viewport (Optional[ViewportSize]): A dictionary specifying the viewport size
-                                  (default: {"width": 1920, "height": 1080}).
+        viewport (Optional[Viewport]): The viewport size
+                                  (default: Viewport(width=1920, height=1080)).
+        device_scale_factor (float): The device pixel ratio the page is rendered at
+                                  (default: 1.0). The recorded video always has the
+                                  viewport size, so higher values only add rendering cost.
+        browser_session (Optional[BrowserSession]): The browser to record with
+                                  (default: the shared BROWSER_SESSION).
+
+    Note:
+        Each instance records in its own context of the session's browser. The
+        session keeps running after the recording, until its `close` method is
+        called.
     """
 
     def __init__(
@@ -63,124 +215,187 @@ class BrowserInteraction(CreateClipCommand):
         url: str,
         text: str,
         *args,
-        viewport: Optional[ViewportSize] = None,
+        viewport: Optional[Viewport] = None,
+        device_scale_factor: float = 1.0,
+        browser_session: Optional[BrowserSession] = None,
         **kwargs,
     ):
         super().__init__(*args, **kwargs)
         self.url = url
-        self.browser = None
-        self.context = None
-        self.page = None
+        self.browser_session = browser_session or BROWSER_SESSION
         self.logger = LoggingManager(__name__).logger
-        self._sync_playwright = sync_playwright().start()
         if viewport is None:
-            self.viewport = ViewportSize(width=1920, height=1080)
+            self.viewport = Viewport(width=1920, height=1080)
         else:
             self.viewport = viewport
-        self.check_viewport()
+        self.device_scale_factor = device_scale_factor
         self.text = text
 
-    def check_viewport(self):
+    def narration_texts(self) -> List[str]:
         """
-        Check the validity of the viewport attribute.
+        Get the texts the command will narrate.
 
-        This function verifies that the `self.viewport` attribute exists and contains
-        both 'width' and 'height' keys, ensuring that it represents a valid viewport
-        configuration.
-
-        Raises:
-            AssertionError: If the `self.viewport` attribute is missing, doesn't
-                            have exactly two keys, or lacks either 'width' or 'height'.
+        Returns:
+            List[str]: The narration text.
+        """
+        return [self.text]
 
-        Example:
-            # Valid viewport configuration
-            self.viewport = {"width": 800, "height": 600}
-            self.check_viewport()  # No AssertionError raised
+    def context_options(self) -> Dict[str, Any]:
+        """
+        Get the keyword arguments used to create the recording browser context.
 
-            # Invalid viewport configurations
-            self.viewport = None
-            self.check_viewport()  # AssertionError raised
+        A HAR file is only recorded when debug logging is enabled and the TUTGEN_HAR
+        environment variable holds a path. Each context records to that path with its
+        own number added before the extension, e.g. `trace-1.har`, `trace-2.har`.
 
-            self.viewport = {"width": 1024}
-            self.check_viewport()  # AssertionError raised
+        Returns:
+            Dict[str, Any]: The options for `Browser.new_context`.
+        """
+        viewport = self.viewport.to_viewport_size()
+        options: Dict[str, Any] = {
+            "record_video_dir": "/tmp",
+            "viewport": viewport,
+            "screen": viewport,
+            "record_video_size": viewport,
+            "device_scale_factor": self.device_scale_factor,
+            "is_mobile": False,
+            "has_touch": False,
+            "color_scheme": "light",
+        }
+        # HAR recording is costly, so it is only enabled for debugging
+        har_path = os.environ.get("TUTGEN_HAR")
+        if har_path and self.logger.isEnabledFor(logging.DEBUG):
+            root, ext = os.path.splitext(har_path)
+            options.update(
+                record_har_path=f"{root}-{next(HAR_COUNTER)}{ext}",
+                record_har_mode="full",
+                record_har_content="embed",
+            )
+        return options
 
-            self.viewport = {"height": 768}
-            self.check_viewport()  # AssertionError raised
+    def execute(self):
         """
-        assert self.viewport, "self.viewport is None"
-        assert len(self.viewport.keys()) == 2, "self.viewport is not a valid viewport"
-        assert "width" in self.viewport.keys(), "self.viewport is missing 'width'"
-        assert "height" in self.viewport.keys(), "self.viewport is missing 'height'"
+        Records browser activities for the specified URL and time period.
 
-    def start_browser(self):
+        The recording runs on the browser session's event loop, so this may be called
+        from any thread.
         """
-        Launches a headless Chromium browser and returns a new page.
+        clip = self.browser_session.run(self.record_async)
 
-        Returns:
-            page (playwright.sync_api.Page): The new browser page.
-        """
-        self.browser = self._sync_playwright.chromium.launch(headless=True)
-        self.context = self.browser.new_context(
-            record_video_dir="/tmp",
-            viewport=self.viewport,
-            screen=self.viewport,
-            record_video_size=self.viewport,
-            device_scale_factor=2.0,
-            is_mobile=False,
-            has_touch=False,
-            color_scheme="light",
-            record_har_mode="full",
-            record_har_content="embed",
-        )
-        self.page = self.context.new_page()
+        self.logger.debug("Handing the video and narration to the receiver...")
+        assert self.receiver, "Receiver is None"
+        self.receiver.add_clip_files(*clip)
 
-    def execute(self):
+    async def record_async(self, browser: "Browser") -> ClipFiles:
         """
-        Records browser activities for the specified URL and time period.
+        Records browser activities for the specified URL using the async Playwright API.
+
+        Args:
+            browser (playwright.async_api.Browser): The browser to open the recording
+                context on.
+
+        Returns:
+            ClipFiles: The recorded video and the narration audio.
         """
+        context = await browser.new_context(**self.context_options())
+        page = await context.new_page()
+        self.logger.debug("Browser context started.")
+
+        try:
+            # Navigate to the URL, waiting for the page to render fully
+            await page.goto(self.url, wait_until="load")
+            self.logger.debug("Navigated to URL: %s", self.url)
+
+            # Generate the narration in a worker thread so other recordings keep running
+            self.logger.debug("Creating MP3 audio for narration...")
+            narrator_audio = await asyncio.to_thread(
+                self.create_narrator_audio, self.text
+            )
+            assert narrator_audio, "Could not create narrator audio"
+            narrator_audio.close()
+            self.logger.debug("Narrator audio created!")
+
+            # Cached narration is ready at once, so keep the page open for as long as
+            # the narration plays to record it for the whole clip
+            await page.wait_for_timeout(narrator_audio.duration * 1000)
+        finally:
+            # Close the context, which finishes the recording
+            await context.close()
+            self.logger.debug("Context closed.")
+
+        playwright_video_obj = page.video
+        assert playwright_video_obj, "No video found"
+        video_path = await playwright_video_obj.path()
 
-        # Start the browser
-        self.start_browser()
-        assert self.browser, "Browser is None"
-        assert self.context, "Context is None"
-        assert self.page, "Page is None"
-        self.logger.debug("Browser started.")
+        return ClipFiles(video_path, narrator_audio.filename, narrator_audio.duration)
 
-        # Navigate to the URL
-        self.page.goto(self.url, wait_until="domcontentloaded")
-        self.logger.debug("Navigated to URL: %s", self.url)
 
-        # Check if narration text is provided and create temporary MP3 audio
-        self.logger.debug("Creating MP3 audio for narration...")
-        narrator_audio = self.create_narrator_audio(self.text)
-        assert narrator_audio, "Could not create narrator audio"
-        self.logger.debug("Narrator audio created!")
+class BrowserInteractionBatch(ClipCommand):
+    """
+    A command that records several browser interactions concurrently.
 
-        # Close the browser
-        self.context.close()
-        self.logger.debug("Context closed.")
-        self.browser.close()
-        self.logger.debug("Browser closed.")
+    The interactions are recorded in separate contexts of the browser session's
+    browser, and their clips are added to the receiver in the given order. Each
+    interaction narrates with its own text-to-speech strategy.
 
-        # Combine the video and audio
-        playwright_video_obj = self.page.video
-        assert playwright_video_obj, "No video found"
-        video_path = playwright_video_obj.path()
-        video = VideoFileClip(video_path)
+    Args:
+        interactions (List[BrowserInteraction]): The browser interactions to record.
+        browser_session (Optional[BrowserSession]): The browser to record with
+            (default: the shared BROWSER_SESSION).
+    """
 
-        self.logger.debug(
-            "Adding audio to the video..."
-        )  # Debug statement for audio processing
-        # Add a 1 second silence at the end of the video
-        video.audio = narrator_audio
-        video.duration = narrator_audio.duration
+    def __init__(
+        self,
+        interactions: List[BrowserInteraction],
+        browser_session: Optional[BrowserSession] = None,
+    ):
+        super().__init__()
+        self.interactions = interactions
+        self.browser_session = browser_session or BROWSER_SESSION
+        self.logger = LoggingManager(__name__).logger
 
-        self.logger.debug(
-            "Writing the final video file..."
-        )  # Debug statement for video processing
+    def prefetch_narration(self):
+        """
+        Generate the narration of every interaction concurrently, ahead of the
+        recording.
+        """
+        if not self.interactions:
+            return
+        with ThreadPoolExecutor(
+            max_workers=min(MAX_TTS_WORKERS, len(self.interactions))
+        ) as executor:
+            list(
+                executor.map(
+                    lambda interaction: interaction.prefetch_narration(),
+                    self.interactions,
+                )
+            )
+
+    async def record_all(self, browser: "Browser") -> List[ClipFiles]:
+        """
+        Records all browser interactions concurrently.
+
+        Args:
+            browser (playwright.async_api.Browser): The browser to open the recording
+                contexts on.
+
+        Returns:
+            List[ClipFiles]: The recorded videos and narration audio, in the order of
+                the interactions.
+        """
+        return await asyncio.gather(
+            *(interaction.record_async(browser) for interaction in self.interactions)
+        )
+
+    def execute(self):
+        """
+        Records the browser interactions and adds their clips to the receiver.
+        """
+        clips = self.browser_session.run(self.record_all)
 
         assert self.receiver, "Receiver is None"
-        self.receiver.add_clip(video)
+        for clip in clips:
+            self.receiver.add_clip_files(*clip)
 
 
 if __name__ == "__main__":
@@ -195,7 +410,10 @@ if __name__ == "__main__":
         "This is a narrator test",
     )
     browser_interaction.set_receiver(receiver)
-    browser_interaction.execute()
+    try:
+        browser_interaction.execute()
+    finally:
+        BROWSER_SESSION.close()
     receiver.dump_file(FINAL_VIDEO_NAME)
 
     print(f"Animation video saved to {FINAL_VIDEO_NAME}")
@@ -50,23 +50,57 @@ Author:
 """
 
 # First-party imports
+import logging
 import os
 import subprocess
-import tempfile
-from typing import Any, Dict, List
+from concurrent.futures import ThreadPoolExecutor
+from importlib.resources import files
+from typing import TYPE_CHECKING, Any, Dict, List
 
 # Third-party imports
 from mako.template import Template
-from moviepy.editor import VideoFileClip, AudioFileClip, concatenate_audioclips
-import pkg_resources
-from pydub import AudioSegment
 
 # Project imports
 from .logging_manager import LoggingManager
-from .video_receiver import VideoReceiver
+from .video_receiver import AUDIO_SAMPLE_RATE, VideoReceiver
 from .command import CreateClipCommand
+from .tts_strategy import CACHE_DIR, MAX_TTS_WORKERS
+
+if TYPE_CHECKING:
+    from moviepy.editor import AudioClip
 
 DEFAULT_DELAY = 500  # Default delay in milliseconds
+# Compiled templates are loaded as code, so they live in the per-user cache, next to
+# but outside the narration cache that CachedTTSStrategy.invalidate removes
+TEMPLATE_CACHE_DIR = os.path.join(CACHE_DIR, "mako")
+
+# The tape template is compiled once, and Mako keeps the compiled module across runs
+TEMPLATE = Template(
+    filename=str(files("tutgen").joinpath("animation.template")),
+    module_directory=TEMPLATE_CACHE_DIR,
+)
+
+
+def make_silence(duration: float, nchannels: int, fps: int) -> "AudioClip":
+    """
+    Create a silent audio clip.
+
+    Args:
+        duration (float): Duration of the silence in seconds.
+        nchannels (int): Number of audio channels.
+        fps (int): Sampling rate of the clip.
+
+    Returns:
+        AudioClip: A clip whose frames are all zeros.
+    """
+    # pylint: disable=import-outside-toplevel
+    import numpy as np
+    from moviepy.editor import AudioClip
+
+    def make_frame(t):
+        return np.zeros((len(t), nchannels)) if np.ndim(t) else np.zeros(nchannels)
+
+    return AudioClip(make_frame, duration=duration, fps=fps)
 
 
 class CodeAnimationGenerator(CreateClipCommand):
@@ -138,7 +172,16 @@ class CodeAnimationGenerator(CreateClipCommand):
         Initialize the CodeAnimationGenerator.
         """
         super().__init__(*args, **kwargs)
-        self.text_mapping = text_mapping
+        # Join list-valued code text once so the rest of the class only sees strings
+        self.text_mapping = [
+            {
+                **item,
+                "code_text": "\n".join(item["code_text"])
+                if isinstance(item["code_text"], list)
+                else item["code_text"],
+            }
+            for item in text_mapping
+        ]
         self.intro_code = intro_code
         self.outro_code = outro_code
         self.typing_speed_ms = typing_speed_ms
@@ -147,6 +190,15 @@ class CodeAnimationGenerator(CreateClipCommand):
         self.height = height
         self.logger = LoggingManager(__name__).logger
 
+    def narration_texts(self) -> List[str]:
+        """
+        Get the texts the command will narrate.
+
+        Returns:
+            List[str]: The narration texts, in order.
+        """
+        return [item["narration_text"] for item in self.text_mapping]
+
     def calculate_timing_info(self) -> List[Dict[str, Any]]:
         """
         Calculate waiting times and durations for multiple text pairs of narration and code.
@@ -161,12 +213,20 @@ class CodeAnimationGenerator(CreateClipCommand):
         """
         timing_info = []
 
-        for item in self.text_mapping:
-            narration_text = item["narration_text"]
-            code_text = "\n".join(item["code_text"])
+        # Create the narration MP3s concurrently, since each one waits on a TTS request
+        with ThreadPoolExecutor(
+            max_workers=max(1, min(MAX_TTS_WORKERS, len(self.text_mapping)))
+        ) as executor:
+            narrator_audios = list(
+                executor.map(
+                    lambda item: self.create_narrator_audio(item["narration_text"]),
+                    self.text_mapping,
+                )
+            )
 
-            # Create a temporary MP3 for narration
-            narrator_audio = self.create_narrator_audio(narration_text)
+        for item, narrator_audio in zip(self.text_mapping, narrator_audios):
+            narration_text = item["narration_text"]
+            code_text = item["code_text"]
             assert narrator_audio, "Failed to create narrator audio"
 
             # Calculate the duration of the code in milliseconds
@@ -182,10 +242,11 @@ class CodeAnimationGenerator(CreateClipCommand):
             )
 
             # Log debug information
-            log_message = "Time to wait for typing: %d ms"
-            self.logger.debug(log_message, time_to_wait_for_typing)
-            log_message = "Time to wait for narration: %d ms"
-            self.logger.debug(log_message, time_to_wait_for_narration)
+            if self.logger.isEnabledFor(logging.DEBUG):
+                log_message = "Time to wait for typing: %d ms"
+                self.logger.debug(log_message, time_to_wait_for_typing)
+                log_message = "Time to wait for narration: %d ms"
+                self.logger.debug(log_message, time_to_wait_for_narration)
 
             # Append the results to the timing_info list
             timing_info.append(
@@ -202,7 +263,7 @@ class CodeAnimationGenerator(CreateClipCommand):
 
     def concatenate_narrator_clips(
         self, timing_dicts: List[Dict[str, Any]]
-    ) -> AudioFileClip | None:
+    ) -> "AudioClip | None":
         """
         Concatenate narrator audio clips with specified pauses in between.
 
@@ -213,98 +274,69 @@ class CodeAnimationGenerator(CreateClipCommand):
                 - "time_to_wait_for_typing": Time in seconds to wait before appending the next clip.
 
         Returns:
-            AudioFileClip | None: The concatenated audio clip, or None if the input list is empty.
+            AudioClip | None: The concatenated audio clip, or None if the input list is empty.
 
         Note:
-            This function uses the tempfile library to create temporary audio files for processing
-            and cleans them up afterward.
+            Pauses are lazy silent clips, so no audio is decoded or encoded here; the
+            concatenated track is only rendered when the final video is written.
         """
-        # Generate input dictionary
-        narrator_audio_dict: Dict[AudioFileClip, int] = {
-            timing_dict["narrator_audio"]: timing_dict["time_to_wait_for_typing"]
-            for timing_dict in timing_dicts
-        }
+        if not timing_dicts:
+            return None
 
         # Stitch the narration audio segments
-        final_audio_clip_list = []
-        temp_files = []
-
-        for narrator_audio, time_to_wait in narrator_audio_dict.items():
-            # Create a temporary file
-            with tempfile.NamedTemporaryFile(suffix=".mp3", delete=False) as temp_file:
-                narrator_audio_path = temp_file.name
-
-                # Write audio content to the temporary file
-                self.logger.debug("Writing audio to %s", narrator_audio_path)
-                narrator_audio.write_audiofile(narrator_audio_path)
-                audio_segment = AudioSegment.from_mp3(narrator_audio_path)
-
-                one_second_of_silence = AudioSegment.silent(
-                    duration=DEFAULT_DELAY + time_to_wait
+        final_audio_clip_list: List["AudioClip"] = []
+
+        for timing_dict in timing_dicts:
+            narrator_audio = timing_dict["narrator_audio"]
+            time_to_wait = timing_dict["time_to_wait_for_typing"]
+            final_audio_clip_list.append(narrator_audio)
+            final_audio_clip_list.append(
+                make_silence(
+                    (DEFAULT_DELAY + time_to_wait) / 1000,
+                    narrator_audio.nchannels,
+                    narrator_audio.fps,
                 )
-                audio_with_pause = audio_segment + one_second_of_silence
-
-                # Export the modified audio to the temporary file
-                self.logger.debug("Exporting modified audio to %s", narrator_audio_path)
-                audio_with_pause.export(narrator_audio_path, format="mp3")
-
-                # Create an AudioFileClip from the temporary file
-                self.logger.debug("Creating AudioFileClip from %s", narrator_audio_path)
-                narrator_audio = AudioFileClip(narrator_audio_path)
-                final_audio_clip_list.append(narrator_audio)
-
-                # Store the temporary file for cleanup
-                temp_files.append(narrator_audio_path)
-
-        final_audio_clip = concatenate_audioclips(final_audio_clip_list)
+            )
 
-        # Clean up temporary files
-        for temp_file in temp_files:
-            self.logger.debug("Cleaning up temporary file: %s", temp_file)
-            os.remove(temp_file)
+        # pylint: disable-next=import-outside-toplevel
+        from moviepy.editor import concatenate_audioclips
 
-        return final_audio_clip
+        return concatenate_audioclips(final_audio_clip_list)
 
-    def format_tape_file(self, input_dict: Dict[str, Any]) -> List[str]:
+    def format_tape_file(
+        self, input_dict: Dict[str, Any], output_dir: str
+    ) -> List[str]:
         """
         Format a tape file based on the provided input data.
 
         Args:
             input_dict (Dict[str, Any]): A dictionary containing input data.
+            output_dir (str): The directory to write the tape file to. The MP4 file
+                rendered from the tape is written there as well.
 
         Returns:
-            List[str]: A list containing the names of the temporary tape and MP4 files.
+            List[str]: A list containing the names of the tape and MP4 files.
         """
-        # Create a Mako template object
-        template_path = pkg_resources.resource_filename("tutgen", "animation.template")
-        template = Template(filename=template_path)
-
-        with tempfile.NamedTemporaryFile(
-            suffix=".tape", mode="w", delete=False
-        ) as temp_tape:
-            temp_tape_name, _ = os.path.splitext(temp_tape.name)
-            temp_mp4_name = temp_tape_name + ".mp4"
-
-            # Render the template with the provided data
-            rendered_content = template.render(
-                animation_file_path=temp_mp4_name,
-                typing_speed_ms=self.typing_speed_ms,
-                width=self.width,
-                height=self.height,
-                intro_code=self.intro_code,
-                outro_code=self.outro_code,
-                input_dict=input_dict,
-                DEFAULT_DELAY=DEFAULT_DELAY,
-            )
-            temp_tape.write(rendered_content)
+        tape_name = os.path.join(output_dir, "animation.tape")
+        mp4_name = os.path.join(output_dir, "animation.mp4")
+
+        # Render the template with the provided data
+        rendered_content = TEMPLATE.render(
+            animation_file_path=mp4_name,
+            typing_speed_ms=self.typing_speed_ms,
+            width=self.width,
+            height=self.height,
+            intro_code=self.intro_code,
+            outro_code=self.outro_code,
+            input_dict=input_dict,
+            DEFAULT_DELAY=DEFAULT_DELAY,
+        )
+        with open(tape_name, "w", encoding="utf-8") as tape_file:
+            tape_file.write(rendered_content)
 
-            self.logger.debug(
-                "Created tape file: %s, MP4 file: %s",
-                temp_tape.name,
-                temp_mp4_name,
-            )
+        self.logger.debug("Created tape file: %s, MP4 file: %s", tape_name, mp4_name)
 
-            return [temp_tape.name, temp_mp4_name]
+        return [tape_name, mp4_name]
 
     def execute(self):
         """
@@ -353,28 +385,43 @@ class CodeAnimationGenerator(CreateClipCommand):
             d["code_text"]: d["time_to_wait_for_narration"] for d in timing_dicts
         }
 
-        log_message = "Generated new_dict: %s, intro_code: %s, outro_code: %s"
-        self.logger.debug(log_message, new_dict, self.intro_code, self.outro_code)
-
-        temp_tape_name, temp_mp4_name = self.format_tape_file(new_dict)
-
-        subprocess.run(
-            f"vhs {temp_tape_name}",
-            shell=True,
-            check=True,
-        )
-
-        video = VideoFileClip(temp_mp4_name)
-
-        assert audio
-        assert video
-
-        video.audio = audio
-        video.duration = audio_duration
+        if self.logger.isEnabledFor(logging.DEBUG):
+            log_message = "Generated new_dict: %s, intro_code: %s, outro_code: %s"
+            self.logger.debug(log_message, new_dict, self.intro_code, self.outro_code)
 
         assert self.receiver
 
-        self.receiver.add_clip(video)
+        try:
+            # Intermediate files live in a directory owned by the receiver, since the
+            # clip is only muxed when the final video is dumped
+            temp_dir = self.receiver.make_temp_dir()
+            temp_tape_name, temp_mp4_name = self.format_tape_file(new_dict, temp_dir)
+
+            try:
+                subprocess.run(
+                    ["vhs", temp_tape_name],
+                    check=True,
+                    stdout=subprocess.DEVNULL,
+                    stderr=subprocess.PIPE,
+                    text=True,
+                )
+            except subprocess.CalledProcessError as cpe:
+                self.logger.error("vhs failed for %s: %s", temp_tape_name, cpe.stderr)
+                raise
+
+            # Uncompressed PCM avoids an extra encode; the clip's AAC track is the only
+            # compressed audio in the pipeline
+            temp_audio_name = os.path.join(temp_dir, "narration.wav")
+            audio.write_audiofile(
+                temp_audio_name, fps=AUDIO_SAMPLE_RATE, codec="pcm_s16le"
+            )
+        finally:
+            # Release the ffmpeg readers behind the narration clips
+            audio.close()
+            for timing_dict in timing_dicts:
+                timing_dict["narrator_audio"].close()
+
+        self.receiver.add_clip_files(temp_mp4_name, temp_audio_name, audio_duration)
 
 
 if __name__ == "__main__":
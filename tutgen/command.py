@@ -9,6 +9,9 @@ creation.
 The `Command` class is an abstract base class for command objects, providing a common interface for
 executing different types of commands.
 
+The `ClipCommand` class is a base class for commands that add video clips to a video
+receiver.
+
 The `CreateClipCommand` class is a command for creating a video clip with narration. It
 allows specifying a text-to-speech (TTS) strategy to use for generating audio narration.
 This class is part of the larger process management system but specifically handles the
@@ -27,15 +30,41 @@ Author:
 # First-party imports
 from abc import ABC, abstractmethod
 from os import environ
-from typing import Optional
-
-# Third-party imports
-from moviepy.editor import AudioFileClip
+from typing import TYPE_CHECKING, List, Optional, Type
 
 # Project imports
 from .logging_manager import LoggingManager
 from .video_receiver import VideoReceiver
-from .tts_strategy import GoogleTTSStrategy, TTSStrategy, VoicemakerTTSStrategy
+from .tts_strategy import (
+    CachedTTSStrategy,
+    GoogleTTSStrategy,
+    TTSStrategy,
+    VoicemakerTTSStrategy,
+    generate_audio_batch,
+)
+
+if TYPE_CHECKING:
+    from moviepy.editor import AudioFileClip
+
+# Voicemaker is used whenever a token is available, otherwise gTTS
+DEFAULT_TTS_STRATEGY_CLS: Type[TTSStrategy] = (
+    VoicemakerTTSStrategy if "VOICEMAKER_TOKEN" in environ else GoogleTTSStrategy
+)
+_DEFAULT_TTS_STRATEGY: Optional[TTSStrategy] = None
+
+
+def get_default_tts_strategy() -> TTSStrategy:
+    """
+    Get the text-to-speech strategy shared by all commands that do not set one,
+    creating it on first use so its HTTP connections are reused across narrations.
+
+    Returns:
+        TTSStrategy: The default text-to-speech strategy.
+    """
+    global _DEFAULT_TTS_STRATEGY  # pylint: disable=global-statement
+    if _DEFAULT_TTS_STRATEGY is None:
+        _DEFAULT_TTS_STRATEGY = DEFAULT_TTS_STRATEGY_CLS()
+    return _DEFAULT_TTS_STRATEGY
 
 
 class Command(ABC):
@@ -50,46 +79,83 @@ class Command(ABC):
         """
 
 
-class CreateClipCommand(Command):
+class ClipCommand(Command):
+    """
+    A command that adds video clips to a video receiver.
+    """
+
+    def __init__(self) -> None:
+        """
+        Initialize the ClipCommand without a receiver.
+        """
+        super().__init__()
+        self.receiver = None
+
+    def set_receiver(self, receiver: VideoReceiver):
+        """
+        Set the video receiver for the command.
+
+        Args:
+            receiver (VideoReceiver): The video receiver.
+        """
+        self.receiver = receiver
+
+    def narration_texts(self) -> List[str]:
+        """
+        Get the texts the command will narrate.
+
+        Returns:
+            List[str]: The narration texts, in order.
+        """
+        return []
+
+    def prefetch_narration(self):
+        """
+        Generate the command's narration ahead of its execution. Does nothing unless
+        overridden.
+        """
+
+
+class CreateClipCommand(ClipCommand):
     """
     A command to create a video clip with narration.
     """
 
-    def __init__(self, tts_strategy: Optional[TTSStrategy] = None) -> None:
+    def __init__(
+        self, tts_strategy: Optional[TTSStrategy] = None, use_cache: bool = True
+    ) -> None:
         """
         Initialize the CreateClipCommand.
 
         Args:
             tts_strategy (Optional[TTSStrategy]): The text-to-speech strategy to use.
+            use_cache (bool): Whether to cache generated narration audio on disk
+                (default is True).
         """
         super().__init__()
-        self.receiver = None
-        self.final_video_obj = None
         self.tts_strategy: Optional[TTSStrategy] = None
         self.logger = LoggingManager(__name__).logger
         if tts_strategy is None:
-            for key in environ:
-                if key == "VOICEMAKER_TOKEN":
-                    self.tts_strategy = VoicemakerTTSStrategy()
-                    self.logger.debug("Using Voicemaker text-to-speech")
-                    break
+            self.tts_strategy = get_default_tts_strategy()
+            self.logger.debug("Using %s", DEFAULT_TTS_STRATEGY_CLS.__name__)
         else:
             self.tts_strategy = tts_strategy
-        if self.tts_strategy is None:
-            self.tts_strategy = GoogleTTSStrategy()
-            self.logger.debug("Using Google text-to-speech")
         assert self.tts_strategy, "No TTS strategy set."
+        if use_cache and not isinstance(self.tts_strategy, CachedTTSStrategy):
+            self.tts_strategy = CachedTTSStrategy(self.tts_strategy)
+            self.logger.debug("Caching text-to-speech audio")
 
-    def set_receiver(self, receiver: VideoReceiver):
+    def prefetch_narration(self):
         """
-        Set the video receiver for the command.
-
-        Args:
-            receiver (VideoReceiver): The video receiver.
+        Generate the command's narration ahead of its execution, so the execution reads
+        it from the cache. Does nothing if the command does not cache narration.
         """
-        self.receiver = receiver
+        if isinstance(self.tts_strategy, CachedTTSStrategy):
+            generate_audio_batch(
+                self.tts_strategy, list(dict.fromkeys(self.narration_texts()))
+            )
 
-    def create_narrator_audio(self, text: str) -> AudioFileClip:
+    def create_narrator_audio(self, text: str) -> "AudioFileClip":
         """
         Create a temporary MP3 file from the given text.
 
@@ -37,6 +37,8 @@ class LoggingManager:
         logger (logging.Logger): The logger instance.
 
     Methods:
+        configure(log_level: int, force: bool) -> None: Configure logging for the
+            whole process.
         log_debug(message: str) -> None: Log a debug message.
         log_info(message: str) -> None: Log an info message.
         log_warning(message: str) -> None: Log a warning message.
@@ -44,13 +46,33 @@ class LoggingManager:
         log_critical(message: str) -> None: Log a critical message.
     """
 
+    _configured = False
+
     def __init__(self, name: str, log_level: int = logging.DEBUG) -> None:
         """
-        Initialize the LoggingManager with the specified log level.
+        Initialize the LoggingManager, configuring logging with the specified log level
+        if it has not been configured yet.
         """
-        logging.basicConfig(level=log_level)
+        if not LoggingManager._configured:
+            LoggingManager.configure(log_level)
         self.logger = logging.getLogger(name)
 
+    @classmethod
+    def configure(cls, log_level: int = logging.DEBUG, force: bool = False) -> None:
+        """
+        Configure logging for the whole process.
+
+        Without `force`, nothing changes when the root logger already has handlers,
+        so importing tutgen leaves the logging set up by a host application alone.
+
+        Args:
+            log_level (int, optional): The logging level to use. Defaults to logging.DEBUG.
+            force (bool, optional): Replace any existing root handlers. Defaults to
+                False.
+        """
+        logging.basicConfig(level=log_level, force=force)
+        cls._configured = True
+
     def log_debug(self, message: str) -> None:
         """
         Log a debug message.
@@ -9,15 +9,177 @@ It imports several modules and classes to handle different aspects of the video
 
 # First-party imports
 import argparse
-from json import load as json_load
-from subprocess import run
+import subprocess
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+# Third-party imports
+try:
+    from orjson import loads as json_loads
+except ImportError:  # Fall back to the standard library parser
+    from json import loads as json_loads
 
 # Project imports
 from .code_animation_generator import CodeAnimationGenerator
-from .browser_interaction import BrowserInteraction
-from .process_management import StartSubshell, ExecuteSubshellCommand, TerminateSubshell
+from .browser_interaction import BrowserInteraction, BrowserInteractionBatch
+from .process_management import (
+    BatchExecuteSubshellCommand,
+    ExecuteSubshellCommand,
+    StartSubshell,
+    SubshellManager,
+    TerminateSubshell,
+)
+from .logging_manager import LoggingManager
+from .command import Command
 from .video_invoker import VideoInvoker
 
+DEFAULT_INTRO_OUTRO_TIMEOUT = 300  # Seconds the intro or outro code may run
+
+
+class BuildContext(NamedTuple):
+    """
+    Settings shared by all commands built from a configuration file.
+    """
+
+    intro_code: str
+    outro_code: str
+    use_cache: bool
+
+
+def build_subshell_command(command: Dict[str, Any], context: BuildContext) -> Command:
+    """
+    Build the command for an ExecuteSubshell entry of a configuration file.
+
+    Entries with `"batch": true` are built as single-item batches, which
+    `append_command` merges with adjacent batch entries for the same subshell. Other
+    entries wait for the subshell before the next command is sent, so they may read
+    from standard input.
+
+    Args:
+        command (Dict[str, Any]): The entry from the configuration file.
+        context (BuildContext): Settings shared by all commands.
+
+    Returns:
+        Command: The command.
+    """
+    if command.get("batch", False):
+        return BatchExecuteSubshellCommand(
+            command["subshell_name"], [(command["command"], None)]
+        )
+    return ExecuteSubshellCommand(command["subshell_name"], command["command"])
+
+
+# Builders for each command type in the configuration file
+COMMAND_BUILDERS: Dict[str, Callable[[Dict[str, Any], BuildContext], Command]] = {
+    "StartSubshell": lambda command, context: StartSubshell(command["name"]),
+    "ExecuteSubshell": build_subshell_command,
+    "BrowserInteraction": lambda command, context: BrowserInteraction(
+        command["url"], command["text"], use_cache=context.use_cache
+    ),
+    "TerminateSubshell": lambda command, context: TerminateSubshell(command["name"]),
+    "CodeAnimationGenerator": lambda command, context: CodeAnimationGenerator(
+        command["text_mapping"],
+        context.intro_code,
+        context.outro_code,
+        use_cache=context.use_cache,
+    ),
+}
+
+
+def append_command(video_commands: List[Command], video_command: Command):
+    """
+    Append a command to a list of commands, merging it into the last command where
+    possible.
+
+    Consecutive browser interactions are merged into a batch, so they are recorded
+    concurrently, while a single interaction is kept as it is. Consecutive batched
+    commands for the same subshell are merged, so they are sent to it at once.
+    Commands that are not batched are never merged.
+
+    Args:
+        video_commands (List[Command]): The commands built so far.
+        video_command (Command): The command to append.
+    """
+    previous = video_commands[-1] if video_commands else None
+    if isinstance(video_command, BrowserInteraction) and isinstance(
+        previous, BrowserInteractionBatch
+    ):
+        previous.interactions.append(video_command)
+    elif isinstance(video_command, BrowserInteraction) and isinstance(
+        previous, BrowserInteraction
+    ):
+        video_commands[-1] = BrowserInteractionBatch([previous, video_command])
+    elif (
+        isinstance(video_command, BatchExecuteSubshellCommand)
+        and isinstance(previous, BatchExecuteSubshellCommand)
+        and previous.subshell_label == video_command.subshell_label
+    ):
+        previous.commands.extend(video_command.commands)
+    else:
+        video_commands.append(video_command)
+
+
+def build_commands(
+    commands: List[Dict[str, Any]], context: BuildContext
+) -> List[Command]:
+    """
+    Build the commands described in a configuration file.
+
+    Every command type is checked before any command is built, so an invalid
+    configuration fails before anything runs.
+
+    Args:
+        commands (List[Dict[str, Any]]): The commands from the configuration file.
+        context (BuildContext): Settings shared by all commands.
+
+    Returns:
+        List[Command]: The commands, in the order they should run.
+
+    Raises:
+        ValueError: If a command has an unknown type or lacks a required key.
+    """
+    for index, command in enumerate(commands):
+        if command.get("type") not in COMMAND_BUILDERS:
+            raise ValueError(
+                f"Command {index} has unknown type {command.get('type')!r}. "
+                f"Valid types are: {', '.join(COMMAND_BUILDERS)}."
+            )
+
+    video_commands: List[Command] = []
+    for index, command in enumerate(commands):
+        try:
+            video_command = COMMAND_BUILDERS[command["type"]](command, context)
+        except KeyError as ke:
+            raise ValueError(
+                f"Command {index} ({command['type']}) is missing the key {ke}."
+            ) from ke
+        append_command(video_commands, video_command)
+    return video_commands
+
+
+def run_shell_code(code: str, timeout: Optional[float]) -> None:
+    """
+    Run intro or outro code as one non-interactive /bin/sh script.
+
+    The script reads no shell startup files and gets no input. It is killed if it
+    runs longer than `timeout`. No shell is started when there is no code.
+
+    Args:
+        code (str): The code to run.
+        timeout (Optional[float]): Seconds the script may run, or None for no limit.
+
+    Raises:
+        subprocess.CalledProcessError: If the script exits with a non-zero status.
+        subprocess.TimeoutExpired: If the script runs longer than `timeout`.
+    """
+    if not code.strip():
+        return
+    subprocess.run(
+        ["/bin/sh", "-c", code],
+        check=True,
+        stdin=subprocess.DEVNULL,
+        timeout=timeout,
+    )
+
 
 def main():
     """
@@ -50,41 +212,51 @@ def main():
     parser.add_argument(
         "json_file", type=str, help="Path to the JSON configuration file."
     )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Regenerate narration audio instead of reusing cached audio.",
+    )
+    parser.add_argument(
+        "--intro-outro-timeout",
+        type=float,
+        default=DEFAULT_INTRO_OUTRO_TIMEOUT,
+        help="Seconds the intro or outro code may run before tutgen stops it "
+        f"(default: {DEFAULT_INTRO_OUTRO_TIMEOUT}).",
+    )
     args = parser.parse_args()
-    with open(args.json_file, "r", encoding="utf-8") as json_file:
-        config = json_load(json_file)
+    LoggingManager.configure(force=True)
+    use_cache = not args.no_cache
+    with open(args.json_file, "rb") as json_file:
+        config = json_loads(json_file.read())
 
     commands = config.get("commands", {})
-    intro_code = "\n".join(config.get("intro_outro", {}).get("intro_code", []))
-    outro_code = "\n".join(config.get("intro_outro", {}).get("outro_code", []))
+    intro_lines = config.get("intro_outro", {}).get("intro_code", [])
+    outro_lines = config.get("intro_outro", {}).get("outro_code", [])
+    # The joined code is built once and shared by every code animation
+    intro_code = "\n".join(intro_lines)
+    outro_code = "\n".join(outro_lines)
     invoker = VideoInvoker()
 
-    run(intro_code, check=True, shell=True)
+    context = BuildContext(intro_code, outro_code, use_cache)
+    video_commands = build_commands(commands, context)
+    # Subshells terminated at the end of the configuration are shut down together
+    final_terminations: List[str] = []
+    while video_commands and isinstance(video_commands[-1], TerminateSubshell):
+        final_terminations.insert(0, video_commands.pop().subshell_label)
 
-    for command in commands:
-        if command["type"] == "StartSubshell":
-            start_subshell = StartSubshell(command["name"])
-            invoker.execute_command(start_subshell)
-        elif command["type"] == "ExecuteSubshell":
-            execute_subshell = ExecuteSubshellCommand(
-                command["subshell_name"], command["command"]
-            )
-            invoker.execute_command(execute_subshell)
-        elif command["type"] == "BrowserInteraction":
-            browser_interaction = BrowserInteraction(command["url"], command["text"])
-            invoker.execute_command(browser_interaction)
-        elif command["type"] == "TerminateSubshell":
-            terminate_subshell = TerminateSubshell(command["name"])
-            invoker.execute_command(terminate_subshell)
-        elif command["type"] == "CodeAnimationGenerator":
-            text_mapping = command["text_mapping"]
-            code_animation_generator = CodeAnimationGenerator(
-                text_mapping, intro_code, outro_code
-            )
-            invoker.execute_command(code_animation_generator)
+    try:
+        run_shell_code(intro_code, args.intro_outro_timeout)
 
-    run(outro_code, check=True, shell=True)
+        invoker.execute_commands(video_commands)
+        SubshellManager().shutdown_all(final_terminations)
+        run_shell_code(outro_code, args.intro_outro_timeout)
+    finally:
+        # Stops any subshell left running
+        SubshellManager().shutdown_all()
 
+    # The final video is assembled once the outro code, which may touch the working
+    # directory, has finished
     output_video_name = config.get("output_video_name", "final_video.mp4")
     invoker.dump_file(output_video_name)
     print(f"Animation video saved to {output_video_name}")
@@ -6,10 +6,11 @@ Process Management
 This module provides classes for managing subshell processes and executing commands within them.
 
 The `SubshellManager` class is a singleton that manages subshell processes associated with labels.
-It provides methods to add, retrieve, and remove subshell processes.
+It provides methods to add, retrieve, and remove subshell processes, and to terminate several
+of them at once.
 
-The `SubshellCommand` class is a base class for subshell commands, and it initializes the logger
-and the `SubshellManager` instance for managing subshells.
+The `SubshellCommand` class is a base class for subshell commands, and it holds the logger
+and the `SubshellManager` instance shared by all subshell commands.
 
 The `StartSubshell` class is a command for starting a subshell process. It sets the PS1 prompt
 and adds the subshell to the `SubshellManager`.
@@ -18,6 +19,9 @@ The `ExecuteSubshellCommand` class is used to execute commands within a subshell
 It sends the command to the subshell and waits for an optional expected output.
 It uses the `SubshellManager` to retrieve the subshell process.
 
+The `BatchExecuteSubshellCommand` class executes several commands within a subshell,
+sending them all at once and then waiting for a marker after each of them.
+
 The `TerminateSubshell` class is a command for terminating a subshell. It forcefully terminates
 the subshell process and removes it from the `SubshellManager`.
 
@@ -50,24 +54,123 @@ Example:
 
 Note:
     This script relies on the external library pexpect,
-    which needs to be installed to run the script successfully.
+    which needs to be installed to run the script successfully. It is imported when the
+    first subshell is started.
 
 Author:
     Roman Parise
 """
 
 # Standard imports
-from typing import Optional, Dict
-
-# Third-party imports
-import pexpect
+import functools
+import os
+import pty
+import signal
+import subprocess
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Tuple, Type
 
 # Project imports
 from .logging_manager import LoggingManager
 from .command import Command
 
+if TYPE_CHECKING:
+    from pexpect import fdpexpect
 
 PS1 = "> "
+# Printed by the subshell with the index and exit status of each batched command
+MARKER = "__TUTGEN_MARK_{}_{}__"
+DEFAULT_TIMEOUT = 30  # Seconds to wait for the output of a subshell command
+SHELL_PATH = "/bin/bash"
+SHELL_MAXREAD = 65536  # Bytes read from the shell at once
+
+
+@functools.cache
+def spawned_shell_class() -> Type["fdpexpect.fdspawn"]:
+    """
+    Get the class of the shells started by `StartSubshell`. pexpect is imported on
+    first use, since only subshell commands need it.
+
+    Returns:
+        Type[fdpexpect.fdspawn]: The shell class.
+    """
+    from pexpect import fdpexpect  # pylint: disable=import-outside-toplevel
+
+    class SpawnedShell(fdpexpect.fdspawn):
+        """
+        A pexpect interface to a shell started with `os.posix_spawn` on a
+        pseudo-terminal.
+
+        Unlike `pexpect.spawn`, which forks the Python process, `posix_spawn` lets
+        CPython use vfork-style process creation, so starting a shell does not copy
+        the parent's page tables.
+
+        Reads are done in large chunks with poll(), and pexpect's delays before each
+        send and after each read are disabled, since the shell is driven
+        programmatically.
+
+        Args:
+            shell_path (str, optional): The shell to start (default is /bin/bash).
+            **kwargs: Keyword arguments for `fdpexpect.fdspawn`.
+        """
+
+        def __init__(self, shell_path: str = SHELL_PATH, **kwargs):
+            kwargs.setdefault("maxread", SHELL_MAXREAD)
+            kwargs.setdefault("use_poll", True)
+            master_fd, slave_fd = pty.openpty()
+            try:
+                self.pid = os.posix_spawn(
+                    shell_path,
+                    [os.path.basename(shell_path)],
+                    os.environ,
+                    file_actions=[
+                        (os.POSIX_SPAWN_DUP2, slave_fd, 0),
+                        (os.POSIX_SPAWN_DUP2, slave_fd, 1),
+                        (os.POSIX_SPAWN_DUP2, slave_fd, 2),
+                        (os.POSIX_SPAWN_CLOSE, slave_fd),
+                        (os.POSIX_SPAWN_CLOSE, master_fd),
+                    ],
+                    setsid=True,
+                )
+            finally:
+                os.close(slave_fd)
+            super().__init__(master_fd, **kwargs)
+            self.delaybeforesend = None
+            self.delayafterread = None
+            self.exitstatus: Optional[int] = None
+
+        def terminate(self, force: bool = False) -> bool:
+            """
+            Terminate the shell with SIGHUP, or with SIGKILL if `force` is set.
+
+            Args:
+                force (bool, optional): Whether to kill the shell (default is False).
+
+            Returns:
+                bool: True once the signal has been sent.
+            """
+            try:
+                os.kill(self.pid, signal.SIGKILL if force else signal.SIGHUP)
+            except ProcessLookupError:
+                pass
+            return True
+
+        def wait(self) -> Optional[int]:
+            """
+            Wait for the shell to exit, then close the pseudo-terminal.
+
+            Returns:
+                Optional[int]: The exit status of the shell, or None if it was killed
+                    by a signal.
+            """
+            _, status = os.waitpid(self.pid, 0)
+            self.exitstatus = os.waitstatus_to_exitcode(status)
+            if self.exitstatus < 0:
+                self.exitstatus = None
+            if self.child_fd != -1:
+                self.close()
+            return self.exitstatus
+
+    return SpawnedShell
 
 
 def singleton(cls):
@@ -113,17 +216,17 @@ class SubshellManager:
 
         Attributes:
             subshell_processes (dict): A dictionary to store subshell processes with labels as keys.
-                                      The values are instances of pexpect.spawn.
+                                      The values are shells started by StartSubshell.
         """
-        self.subshell_processes: Dict[str, pexpect.spawn] = {}
+        self.subshell_processes: Dict[str, "fdpexpect.fdspawn"] = {}
 
-    def add_subshell(self, label: str, subshell_process: pexpect.spawn):
+    def add_subshell(self, label: str, subshell_process: "fdpexpect.fdspawn"):
         """
         Add a subshell process to the manager with a given label.
 
         Args:
             label (str): The label to associate with the subshell process.
-            subshell_process (pexpect.spawn): The subshell process to be added.
+            subshell_process (fdpexpect.fdspawn): The subshell process to be added.
 
         Raises:
             ValueError: If a subshell with the same label already exists in the manager.
@@ -132,7 +235,7 @@ class SubshellManager:
             raise ValueError(f"A subshell with label '{label}' already exists.")
         self.subshell_processes[label] = subshell_process
 
-    def get_subshell(self, label: str) -> Optional[pexpect.spawn]:
+    def get_subshell(self, label: str) -> Optional["fdpexpect.fdspawn"]:
         """
         Retrieve a subshell process by its label.
 
@@ -140,7 +243,7 @@ class SubshellManager:
             label (str): The label associated with the subshell process.
 
         Returns:
-            pexpect.spawn or None: The subshell process corresponding to the label,
+            fdpexpect.fdspawn or None: The subshell process corresponding to the label,
                                    or None if no such label exists.
         """
         return self.subshell_processes.get(label)
@@ -154,18 +257,43 @@ class SubshellManager:
         """
         del self.subshell_processes[label]
 
+    def shutdown_all(self, labels: Optional[Iterable[str]] = None):
+        """
+        Terminate several subshell processes at once and remove them from the manager.
+
+        Every subshell is killed before any is waited for, so they exit concurrently.
+
+        Args:
+            labels (Optional[Iterable[str]]): The labels of the subshells to terminate.
+                Labels without a subshell are ignored. If None, every subshell is
+                terminated.
+        """
+        if labels is None:
+            labels = list(self.subshell_processes)
+        subshell_processes = [
+            self.subshell_processes.pop(label)
+            for label in labels
+            if label in self.subshell_processes
+        ]
+        for subshell_process in subshell_processes:
+            subshell_process.terminate(force=True)
+        for subshell_process in subshell_processes:
+            subshell_process.wait()
+
 
 class SubshellCommand(Command):
     """
     Base class for subshell commands.
+
+    The logger and the `SubshellManager` are shared by all subshell commands, so they
+    are looked up once rather than for every command.
     """
 
+    logger = LoggingManager(__name__).logger
+    subshell_manager = SubshellManager()
+
     def __init__(self, subshell_label: str):
         self.subshell_label = subshell_label
-        self.logger = LoggingManager(__name__).logger
-        assert self.logger, "Logger is not initialized."
-        self.subshell_manager = SubshellManager()
-        assert self.subshell_manager, "Subshell manager is not initialized."
 
 
 class StartSubshell(SubshellCommand):
@@ -174,8 +302,7 @@ class StartSubshell(SubshellCommand):
     """
 
     def execute(self) -> None:
-        subshell_command = "bash"
-        subshell_process = pexpect.spawn(subshell_command)
+        subshell_process = spawned_shell_class()()
         assert subshell_process, "Could not create subshell process"
         subshell_process.sendline(f"PS1={repr(PS1)}")
         subshell_process.expect(PS1)
@@ -227,6 +354,84 @@ class ExecuteSubshellCommand(SubshellCommand):
         self.logger.debug("Successfully executed command: %s", self.command)
 
 
+class BatchExecuteSubshellCommand(SubshellCommand):
+    """
+    Class for executing several commands in a subshell at once.
+
+    All commands are written to the subshell in a single send, each followed by an echo
+    of a numbered marker. The markers are then awaited in order, along with the optional
+    expected output of each command. Since the commands are sent before any has run, a
+    command that reads from standard input would consume the commands after it.
+
+    Args:
+        label (str): The label of the subshell.
+        commands (List[Tuple[str, Optional[str]]]): The commands to execute, each with
+            an optional expected output.
+        check (bool, optional): Whether to raise if a command exits with a non-zero
+            status (default is False).
+        timeout (Optional[float], optional): Seconds to wait for each command, or None
+            to wait indefinitely (default is 30).
+
+    Raises:
+        subprocess.CalledProcessError: If `check` is set and a command fails.
+    """
+
+    def __init__(
+        self,
+        label: str,
+        commands: List[Tuple[str, Optional[str]]],
+        check: bool = False,
+        timeout: Optional[float] = DEFAULT_TIMEOUT,
+    ):
+        super().__init__(label)
+        self.commands = commands
+        self.check = check
+        self.timeout = timeout
+
+    def execute(self):
+        if not self.commands:
+            return
+
+        try:
+            subshell_process = self.subshell_manager.get_subshell(self.subshell_label)
+        except KeyError as ke:
+            self.logger.debug(
+                "No subshell named '%s' is running: %s", self.subshell_label, ke
+            )
+            return
+
+        assert subshell_process, "No subshell is running."
+
+        # The empty quotes keep the terminal's echo of the input from matching the
+        # markers printed by the shell
+        lines = []
+        for index, (command, _) in enumerate(self.commands):
+            lines.append(command)
+            lines.append("echo " + MARKER.format(f'""{index}', "$?"))
+        subshell_process.sendline("\n".join(lines))
+        self.logger.debug("Executing %d commands...", len(self.commands))
+        failure: Optional[subprocess.CalledProcessError] = None
+        for index, (command, expect) in enumerate(self.commands):
+            if expect:
+                self.logger.debug("Waiting for %s", repr(expect))
+                subshell_process.expect(expect, timeout=self.timeout)
+                self.logger.debug("Output: %s", subshell_process.before)
+            subshell_process.expect(
+                MARKER.format(index, r"(\d+)"), timeout=self.timeout
+            )
+            returncode = int(subshell_process.match.group(1))
+            if returncode != 0 and self.check and failure is None:
+                failure = subprocess.CalledProcessError(returncode, command)
+            self.logger.debug(
+                "Executed command with status %d: %s", returncode, command
+            )
+        self.logger.debug("Waiting for PS1=%s", repr(PS1))
+        subshell_process.expect(PS1, timeout=self.timeout)
+        # The remaining commands were already sent, so wait for them before raising
+        if failure is not None:
+            raise failure
+
+
 class TerminateSubshell(SubshellCommand):
     """
     Class for terminating the subshell process.
@@ -249,7 +454,7 @@ class TerminateSubshell(SubshellCommand):
         self.logger.debug("Subshell terminated.")
 
         try:
-            SubshellManager().remove_subshell(self.subshell_label)
+            self.subshell_manager.remove_subshell(self.subshell_label)
         except KeyError as ke:
             self.logger.debug(
                 "No subshell named '%s' is running: %s", self.subshell_label, ke
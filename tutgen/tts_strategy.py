@@ -8,25 +8,315 @@ libraries.
 """
 
 # First-party imports
+import atexit
+import base64
+import functools
+import hashlib
+import io
+import json
+import os
+import re
+import shutil
+import urllib.request
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
 from os import environ
 from tempfile import NamedTemporaryFile
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Optional, Type, Union
 
 # Third-party imports
-from voicemaker import Voicemaker
-from gtts import gTTS
-from moviepy.editor import AudioFileClip
+from gtts import gTTS, gTTSError
+from gtts.version import __version__ as GTTS_VERSION
+import requests
+from requests.adapters import HTTPAdapter
+import urllib3
+
+try:
+    import httpx
+except ImportError:  # gTTS requests fall back to HTTP/1.1 through requests
+    httpx = None
+
+if TYPE_CHECKING:
+    from moviepy.editor import AudioFileClip
+    from voicemaker import Voicemaker
+
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "tutgen")
+TTS_CACHE_DIR = os.path.join(CACHE_DIR, "tts")  # Only holds cached narration audio
+HTTP_POOL_SIZE = 8  # Connections kept alive per host, one per concurrent TTS request
+HTTP_TIMEOUT = 30  # Seconds to wait for a TTS API response
+MAX_TTS_WORKERS = HTTP_POOL_SIZE  # Maximum number of concurrent text-to-speech requests
+# The gTTS release whose private request API SessionGTTS.stream relies on
+SESSION_GTTS_VERSION = "2.4.0"
+# Generated audio is written to tmpfs where available, so it never touches the disk
+TTS_TEMP_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else None
+
+
+def remove_file(path: str) -> None:
+    """
+    Remove a file if it still exists.
+
+    Args:
+        path (str): The path of the file.
+    """
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def create_session() -> requests.Session:
+    """
+    Create an HTTP session whose connections are kept alive and reused across requests.
+
+    Returns:
+        requests.Session: The session.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def create_gtts_session() -> Union[requests.Session, "httpx.Client"]:
+    """
+    Create the HTTP session for gTTS requests. An HTTP/2 client is used when httpx and
+    its h2 extra are installed, so concurrent requests share one connection.
+
+    Returns:
+        Union[requests.Session, httpx.Client]: The session.
+    """
+    if httpx is not None:
+        try:
+            # Certificates are not verified, as gTTS does (for proxies and firewalls)
+            return httpx.Client(
+                http2=True,
+                verify=False,
+                timeout=HTTP_TIMEOUT,
+                limits=httpx.Limits(
+                    max_connections=HTTP_POOL_SIZE,
+                    max_keepalive_connections=HTTP_POOL_SIZE,
+                ),
+            )
+        except ImportError:
+            pass  # h2 is not installed
+    return create_session()
+
+
+class SessionGTTS(gTTS):
+    """
+    gTTS variant that sends its requests through a shared HTTP session.
+
+    Sending through the session relies on gTTS internals, so it is only done with the
+    gTTS release pinned in requirements.txt. Other releases fall back to gTTS's own
+    requests.
+
+    Args:
+        session (Union[requests.Session, httpx.Client]): The session to send the
+            requests through, as created by `create_gtts_session`.
+        *args: Positional arguments for gTTS.
+        **kwargs: Keyword arguments for gTTS.
+    """
+
+    def __init__(
+        self, session: Union[requests.Session, "httpx.Client"], *args, **kwargs
+    ):
+        super().__init__(*args, **kwargs)
+        self.session = session
+
+    def stream(self):
+        """
+        Do the TTS API requests and stream the MP3 bytes, as gTTS.stream does.
+
+        Raises:
+            gTTSError: When there's an error with the API request.
+        """
+        if GTTS_VERSION != SESSION_GTTS_VERSION:
+            yield from super().stream()
+            return
+
+        # gTTS does not verify certificates (for proxies and firewalls), so silence
+        # urllib3's warning about it as gTTS does
+        urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+        for prepared_request in self._prepare_requests():
+            if isinstance(self.session, requests.Session):
+                yield from self.send_http1(prepared_request)
+            else:
+                yield from self.send_http2(prepared_request)
+
+    def send_http1(self, prepared_request: requests.PreparedRequest) -> Iterator[bytes]:
+        """
+        Send a prepared TTS API request through the requests session.
+
+        Args:
+            prepared_request (requests.PreparedRequest): The request made by gTTS.
+
+        Returns:
+            Iterator[bytes]: The MP3 bytes in the response.
+
+        Raises:
+            gTTSError: When there's an error with the API request.
+        """
+        try:
+            response = self.session.send(
+                prepared_request, proxies=urllib.request.getproxies(), verify=False
+            )
+            response.raise_for_status()
+        except requests.exceptions.HTTPError as he:
+            raise gTTSError(tts=self, response=response) from he
+        except requests.exceptions.RequestException as rqe:
+            raise gTTSError(tts=self) from rqe
+
+        return self.decode_audio(
+            response.iter_lines(chunk_size=1024),
+            gTTSError(tts=self, response=response),
+        )
+
+    def send_http2(self, prepared_request: requests.PreparedRequest) -> Iterator[bytes]:
+        """
+        Send a prepared TTS API request through the HTTP/2 client.
+
+        Args:
+            prepared_request (requests.PreparedRequest): The request made by gTTS.
+
+        Returns:
+            Iterator[bytes]: The MP3 bytes in the response.
+
+        Raises:
+            gTTSError: When there's an error with the API request.
+        """
+        # httpx sets the length of the body itself
+        headers = {
+            name: value
+            for name, value in prepared_request.headers.items()
+            if name.lower() != "content-length"
+        }
+        try:
+            response = self.session.post(
+                prepared_request.url, content=prepared_request.body, headers=headers
+            )
+        except httpx.HTTPError as he:
+            raise gTTSError(tts=self) from he
+
+        error = gTTSError(
+            f"{response.status_code:d} ({response.reason_phrase}) from TTS API",
+            tts=self,
+        )
+        if response.is_error:
+            raise error
+        return self.decode_audio(
+            (line.encode("utf-8") for line in response.iter_lines()), error
+        )
+
+    def decode_audio(self, lines: Iterable[bytes], error: gTTSError) -> Iterator[bytes]:
+        """
+        Decode the MP3 bytes in the lines of a TTS API response.
+
+        Args:
+            lines (Iterable[bytes]): The lines of the response.
+            error (gTTSError): The error to raise if the response holds no audio.
+
+        Returns:
+            Iterator[bytes]: The MP3 bytes.
+
+        Raises:
+            gTTSError: When the response holds no audio.
+        """
+        for line in lines:
+            decoded_line = line.decode("utf-8")
+            if "jQ1olc" in decoded_line:
+                audio_search = re.search(r'jQ1olc","\[\\"(.*)\\"]', decoded_line)
+                if not audio_search:
+                    raise error
+                yield base64.b64decode(audio_search.group(1).encode("ascii"))
+
+
+def open_audio_clip(path: str) -> "AudioFileClip":
+    """
+    Open an audio file as an AudioFileClip.
+
+    moviepy is imported on first use rather than with this module, since importing it
+    takes a noticeable part of startup and runs without clips never need it.
+
+    Args:
+        path (str): The path of the audio file.
+
+    Returns:
+        AudioFileClip: The audio clip.
+    """
+    from moviepy.editor import AudioFileClip  # pylint: disable=import-outside-toplevel
+
+    return AudioFileClip(path)
+
+
+@functools.cache
+def session_voicemaker_class() -> Type["Voicemaker"]:
+    """
+    Get the Voicemaker client class that sends its requests through a shared HTTP
+    session. voicemaker is imported on first use, since only VoicemakerTTSStrategy
+    needs it.
+
+    Returns:
+        Type[Voicemaker]: The client class.
+    """
+    from voicemaker import Voicemaker  # pylint: disable=import-outside-toplevel
+
+    class SessionVoicemaker(Voicemaker):
+        """
+        Voicemaker client that sends its requests through a shared HTTP session.
+
+        Args:
+            session (requests.Session): The session to send the requests through.
+            token (Optional[str]): The Voicemaker API token.
+        """
+
+        def __init__(self, session: requests.Session, token: Optional[str] = None):
+            """
+            Initialize the client with the session to send its requests through.
+            """
+            super().__init__(token)
+            self.session = session
+
+        def __post__(self, api: str, data=None):
+            """
+            Send a POST request to the Voicemaker API and return the JSON response.
+            """
+            result = self.session.post(
+                self.base_url + api, json=data or {}, headers=self.__headers__()
+            )
+            result.raise_for_status()
+            return result.json()
+
+        def generate_audio_to_file(self, out_path: str, text: str, **kwargs) -> None:
+            """
+            Generate audio from text and download the MP3 to `out_path`.
+            """
+            url = self.generate_audio_url(text, **kwargs)
+            result = self.session.get(url)
+            result.raise_for_status()
+            with open(out_path, "wb") as out_file:
+                out_file.write(result.content)
+
+    return SessionVoicemaker
 
 
 class TTSStrategy(ABC):
     """
     Abstract base class for text-to-speech strategies.
 
-    Subclasses must implement the `generate_audio` method.
+    Subclasses must implement the `generate_audio` method, and may override
+    `generate_audio_file` when they write the MP3 themselves.
+
+    Attributes:
+        voice_params (Dict[str, str]): Parameters that affect the generated voice.
+            They are part of the cache key used by `CachedTTSStrategy`.
     """
 
+    voice_params: Dict[str, str] = {}
+
     @abstractmethod
-    def generate_audio(self, text: str) -> AudioFileClip:
+    def generate_audio(self, text: str) -> "AudioFileClip":
         """
         Generate audio from text and return an AudioFileClip.
 
@@ -37,15 +327,41 @@ class TTSStrategy(ABC):
             AudioFileClip: An audio clip representing the generated audio.
         """
 
+    def generate_audio_file(self, text: str) -> str:
+        """
+        Generate audio from text and return the path of the generated MP3 file.
+
+        Subclasses that write the MP3 themselves should override this method, so callers
+        that only need the file don't open an AudioFileClip.
+
+        Args:
+            text (str): The text to convert to audio.
+
+        Returns:
+            str: The path of the generated MP3 file.
+        """
+        audio = self.generate_audio(text)
+        audio.close()
+        return audio.filename
+
 
 class GoogleTTSStrategy(TTSStrategy):
     """
     Text-to-speech strategy using the gTTS library.
+
+    Requests are sent through one HTTP session, so connections are reused across calls.
+    The session uses HTTP/2 when httpx is installed with its h2 extra.
     """
 
-    def generate_audio(self, text: str) -> AudioFileClip:
+    voice_params = {"lang": "en"}
+
+    def __init__(self) -> None:
+        self.session = create_gtts_session()
+
+    def generate_audio(self, text: str) -> "AudioFileClip":
         """
-        Generate audio from text using gTTS and return an AudioFileClip.
+        Generate audio from text using gTTS and return an AudioFileClip. The MP3 file
+        is removed when the interpreter exits.
 
         Args:
             text (str): The text to convert to audio.
@@ -53,20 +369,45 @@ class GoogleTTSStrategy(TTSStrategy):
         Returns:
             AudioFileClip: An audio clip representing the generated audio.
         """
-        with NamedTemporaryFile(suffix=".mp3", delete=False) as temp_mp3:
-            tts = gTTS(text=text, lang="en")
-            tts.save(temp_mp3.name)
-            return AudioFileClip(temp_mp3.name)
+        path = self.generate_audio_file(text)
+        atexit.register(remove_file, path)
+        return open_audio_clip(path)
+
+    def generate_audio_file(self, text: str) -> str:
+        """
+        Generate audio from text using gTTS and return the path of the MP3 file.
+
+        Args:
+            text (str): The text to convert to audio.
+
+        Returns:
+            str: The path of the generated MP3 file.
+        """
+        # The MP3 is buffered in memory, so a failed request leaves no file behind
+        mp3_buffer = io.BytesIO()
+        tts = SessionGTTS(self.session, text=text, **self.voice_params)
+        tts.write_to_fp(mp3_buffer)
+        with NamedTemporaryFile(
+            suffix=".mp3", dir=TTS_TEMP_DIR, delete=False
+        ) as temp_mp3:
+            temp_mp3.write(mp3_buffer.getbuffer())
+            return temp_mp3.name
 
 
 class VoicemakerTTSStrategy(TTSStrategy):
     """
     Text-to-speech strategy using the Voicemaker library.
+
+    Requests are sent through one HTTP session, so connections are reused across calls.
     """
 
-    def generate_audio(self, text: str) -> AudioFileClip:
+    def __init__(self) -> None:
+        self.vm_handler = session_voicemaker_class()(create_session())
+
+    def generate_audio(self, text: str) -> "AudioFileClip":
         """
-        Generate audio from text using Voicemaker and return an AudioFileClip.
+        Generate audio from text using Voicemaker and return an AudioFileClip. The MP3
+        file is removed when the interpreter exits.
 
         Args:
             text (str): The text to convert to audio.
@@ -74,9 +415,137 @@ class VoicemakerTTSStrategy(TTSStrategy):
         Returns:
             AudioFileClip: An audio clip representing the generated audio.
         """
-        vm_handler = Voicemaker()
+        path = self.generate_audio_file(text)
+        atexit.register(remove_file, path)
+        return open_audio_clip(path)
+
+    def generate_audio_file(self, text: str) -> str:
+        """
+        Generate audio from text using Voicemaker and return the path of the MP3 file.
+
+        Args:
+            text (str): The text to convert to audio.
+
+        Returns:
+            str: The path of the generated MP3 file.
+        """
         token = environ["VOICEMAKER_TOKEN"]
-        vm_handler.set_token(token)
-        with NamedTemporaryFile(suffix=".mp3", delete=False) as temp_mp3:
-            vm_handler.generate_audio_to_file(temp_mp3.name, text)
-            return AudioFileClip(temp_mp3.name)
+        self.vm_handler.set_token(token)
+        with NamedTemporaryFile(
+            suffix=".mp3", dir=TTS_TEMP_DIR, delete=False
+        ) as temp_mp3:
+            self.vm_handler.generate_audio_to_file(temp_mp3.name, text)
+            return temp_mp3.name
+
+
+class CachedTTSStrategy(TTSStrategy):
+    """
+    Text-to-speech strategy that caches the audio generated by another strategy on disk.
+
+    Audio files are keyed by a BLAKE2b hash of the wrapped strategy's class name, its
+    voice parameters and the text, so narration that recurs across clips or runs is
+    only synthesized once. Files are moved into the cache atomically, so concurrent
+    runs never see a partially written file.
+
+    Args:
+        strategy (TTSStrategy): The strategy used to generate audio on a cache miss.
+        cache_dir (str, optional): Directory holding the cached MP3 files, which is
+            removed by `invalidate` (default is ~/.cache/tutgen/tts).
+    """
+
+    def __init__(self, strategy: TTSStrategy, cache_dir: str = TTS_CACHE_DIR) -> None:
+        self.strategy = strategy
+        self.cache_dir = cache_dir
+
+    def cache_path(self, text: str) -> str:
+        """
+        Get the path of the cached audio file for the given text.
+
+        Args:
+            text (str): The text to convert to audio.
+
+        Returns:
+            str: The path of the cached MP3 file.
+        """
+        key = "\0".join(
+            [
+                type(self.strategy).__name__,
+                json.dumps(self.strategy.voice_params, sort_keys=True),
+                text,
+            ]
+        )
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).hexdigest()
+        return os.path.join(self.cache_dir, f"{digest}.mp3")
+
+    def generate_audio(self, text: str) -> "AudioFileClip":
+        """
+        Return the cached audio for the given text, generating it on a cache miss.
+
+        Args:
+            text (str): The text to convert to audio.
+
+        Returns:
+            AudioFileClip: An audio clip representing the generated audio.
+        """
+        return open_audio_clip(self.generate_audio_file(text))
+
+    def generate_audio_file(self, text: str) -> str:
+        """
+        Return the path of the cached MP3 file for the given text, generating it on a
+        cache miss.
+
+        Args:
+            text (str): The text to convert to audio.
+
+        Returns:
+            str: The path of the cached MP3 file.
+        """
+        path = self.cache_path(text)
+        if not os.path.exists(path):
+            source_path = self.strategy.generate_audio_file(text)
+            os.makedirs(self.cache_dir, exist_ok=True)
+            # Stage the file next to its final path, since os.replace is only atomic
+            # within a filesystem
+            with NamedTemporaryFile(
+                suffix=".part", dir=self.cache_dir, delete=False
+            ) as staged_file:
+                staged_path = staged_file.name
+            shutil.move(source_path, staged_path)
+            os.replace(staged_path, path)
+        return path
+
+    def invalidate(self, text: Optional[str] = None) -> None:
+        """
+        Remove cached audio.
+
+        Args:
+            text (Optional[str]): The text whose audio should be removed. If None,
+                the whole cache directory is removed.
+        """
+        if text is None:
+            shutil.rmtree(self.cache_dir, ignore_errors=True)
+        elif os.path.exists(self.cache_path(text)):
+            os.remove(self.cache_path(text))
+
+
+def generate_audio_batch(
+    strategy: TTSStrategy, texts: List[str], max_workers: int = MAX_TTS_WORKERS
+) -> List[str]:
+    """
+    Generate the MP3 files for several texts concurrently.
+
+    With a CachedTTSStrategy, this can be used to fill the cache ahead of time, so
+    narration is synthesized in parallel rather than one clip at a time.
+
+    Args:
+        strategy (TTSStrategy): The strategy used to generate the audio.
+        texts (List[str]): The texts to convert to audio.
+        max_workers (int): The maximum number of concurrent requests.
+
+    Returns:
+        List[str]: The paths of the MP3 files, in the order of the texts.
+    """
+    if not texts:
+        return []
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(texts))) as executor:
+        return list(executor.map(strategy.generate_audio_file, texts))
@@ -13,6 +13,9 @@ create instructional videos. It collaborates with classes like `CodeAnimationGen
 `BrowserInteraction`, and `ProcessManagement` to record video segments and assemble
 them into a final video.
 
+The `execute_commands` method runs a sequence of commands in order, while the narration
+of upcoming clips is generated in the background.
+
 Usage:
     To create and execute a sequence of video commands, initialize an instance of
     the `VideoInvoker` class and use its methods. This class works with command objects
@@ -44,12 +47,105 @@ Author:
     Roman Parise
 """
 
+# First-party imports
+import threading
+from typing import List, Optional, Set
+
 # Project imports
+from .logging_manager import LoggingManager
 from .video_receiver import VideoReceiver
-from .command import Command, CreateClipCommand
+from .command import Command, ClipCommand
 from .code_animation_generator import CodeAnimationGenerator
-from .browser_interaction import BrowserInteraction
-from .process_management import StartSubshell, ExecuteSubshellCommand, TerminateSubshell
+from .browser_interaction import (
+    BROWSER_SESSION,
+    BrowserInteraction,
+    BrowserInteractionBatch,
+)
+from .process_management import (
+    StartSubshell,
+    ExecuteSubshellCommand,
+    TerminateSubshell,
+)
+
+PREFETCH_DEPTH = 2  # Number of clip commands whose narration is generated in advance
+
+
+class NarrationPrefetcher:
+    """
+    Generates the narration of clip commands in a background thread, ahead of their
+    execution, so narration for the next clips is synthesized while the current one
+    is recorded.
+
+    Commands are prefetched in order, at most `depth` commands ahead of those that have
+    started. A command that starts before its turn generates its own narration.
+
+    Args:
+        commands (List[ClipCommand]): The clip commands, in order.
+        depth (int, optional): The maximum number of commands prefetched but not yet
+            started (default is 2).
+    """
+
+    def __init__(self, commands: List[ClipCommand], depth: int = PREFETCH_DEPTH):
+        self.commands = commands
+        self.depth = depth
+        self.logger = LoggingManager(__name__).logger
+        self._condition = threading.Condition()
+        self._prefetching: Optional[ClipCommand] = None
+        self._prefetched: Set[ClipCommand] = set()
+        self._started: Set[ClipCommand] = set()
+        self._stopped = False
+        self._thread = threading.Thread(
+            target=self._run, name="tutgen_prefetch", daemon=True
+        )
+
+    def start(self):
+        """
+        Starts prefetching narration.
+        """
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stops prefetching narration after the command being prefetched, if any.
+        """
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+
+    def command_started(self, command: ClipCommand):
+        """
+        Records that a command is starting, waiting for its narration if it is being
+        prefetched.
+
+        Args:
+            command (ClipCommand): The command.
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self._prefetching is not command)
+            self._prefetched.discard(command)
+            self._started.add(command)
+            self._condition.notify_all()
+
+    def _run(self):
+        for command in self.commands:
+            with self._condition:
+                self._condition.wait_for(
+                    lambda: self._stopped or len(self._prefetched) < self.depth
+                )
+                if self._stopped:
+                    return
+                if command in self._started:
+                    continue
+                self._prefetching = command
+            try:
+                command.prefetch_narration()
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                # The command generates its narration itself and reports the error
+                self.logger.debug("Failed to prefetch narration: %s", e)
+            with self._condition:
+                self._prefetching = None
+                self._prefetched.add(command)
+                self._condition.notify_all()
 
 
 class VideoInvoker:
@@ -70,15 +166,53 @@ class VideoInvoker:
         Args:
             command (Command): The command to execute.
         """
-        if isinstance(command, CreateClipCommand):
+        if isinstance(command, ClipCommand):
             command.set_receiver(self.video_receiver)
             command.execute()
         else:
             command.execute()
 
+    def execute_commands(
+        self, commands: List[Command], prefetch_depth: int = PREFETCH_DEPTH
+    ):
+        """
+        Executes a sequence of commands in order.
+
+        The narration of upcoming clip commands is generated in the background while
+        earlier commands run. The browser sessions used by the commands are closed once
+        the commands have finished.
+
+        Args:
+            commands (List[Command]): The commands, in the order of the final video.
+            prefetch_depth (int, optional): The number of clip commands whose narration
+                is generated in advance (default is 2).
+
+        Raises:
+            Exception: The first exception raised by a command. The remaining commands
+                are not run.
+        """
+        prefetcher = NarrationPrefetcher(
+            [command for command in commands if isinstance(command, ClipCommand)],
+            depth=prefetch_depth,
+        )
+        prefetcher.start()
+        try:
+            for command in commands:
+                if isinstance(command, ClipCommand):
+                    prefetcher.command_started(command)
+                self.execute_command(command)
+        finally:
+            prefetcher.stop()
+            for browser_session in {
+                command.browser_session
+                for command in commands
+                if isinstance(command, (BrowserInteraction, BrowserInteractionBatch))
+            }:
+                browser_session.close()
+
     def dump_file(self, output_filename: str = "output.mp4"):
         """
-        Saves the full movie to an mp4 file using write_videofile.
+        Saves the full movie to an mp4 file.
 
         Args:
             output_filename (str): The name of the output video file.
@@ -149,7 +283,10 @@ if __name__ == '__main__':
         "http://localhost:5000/",
         "As you can see, the webpage is rendered as expected.",
     )
-    invoker.execute_command(browser_interaction)
+    try:
+        invoker.execute_command(browser_interaction)
+    finally:
+        BROWSER_SESSION.close()
 
     # Kill subshell
     kill_subshell = TerminateSubshell("server_subshell")
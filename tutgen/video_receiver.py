@@ -9,22 +9,329 @@ be executed. It encapsulates these commands as objects, allowing for flexible an
 extensible video processing operations.
 
 The VideoReceiver class provides methods for adding video clips and dumping the final
-result to an output file.
+result to an output file. Clips are MP4 files on disk, or pairs of video and audio files
+that are muxed when the final video is dumped. The final video is produced by ffmpeg's
+concat demuxer without re-encoding, once clips of differing formats have been
+re-encoded to a common one.
+
+The `probe_video` function reads the codec and duration of a video file, and the
+`probe_format` function reads the properties that clips must share to be concatenated
+without re-encoding. The `mux_clip` function combines a recorded video with its
+narration audio into an MP4 clip suitable for the VideoReceiver, and the `encode_clip`
+function re-encodes a clip to a given frame size and to the audio format of muxed
+clips.
 
 Note:
-    This script relies on the external library moviepy,
-    which needs to be installed to run the script successfully.
+    This script relies on the external library PyAV and the external program ffmpeg,
+    which need to be installed to run the script successfully.
 
 Author:
     Roman Parise
 """
 
+# First-party imports
+import os
+import subprocess
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from fractions import Fraction
+from typing import List, NamedTuple, Optional, Tuple, Union
+
 # Third-party imports
-from moviepy.editor import VideoFileClip, concatenate_videoclips
+import av
 
 # Project imports
 from .logging_manager import LoggingManager
 
+AUDIO_SAMPLE_RATE = 44100  # Sample rate of the clip audio in Hz
+VIDEO_FRAME_RATE = 25  # Frame rate of re-encoded clips, matching the VHS tape
+ENCODER_PRESET = "veryfast"  # libx264 preset for re-encoded clips
+MAX_MUX_WORKERS = os.cpu_count() or 1  # Number of clips muxed at once
+# Seconds each clip's duration may change by when clips are concatenated
+DURATION_TOLERANCE = 0.1
+# Re-encoded video is converted to BT.709, so its colour tags do not depend on the input
+COLOR_FILTER = "out_color_matrix=bt709:out_range=tv"
+
+
+class VideoFormat(NamedTuple):
+    """
+    The properties of a clip's video stream that must match for clips to be
+    concatenated without re-encoding.
+
+    The extradata holds the H.264 parameter sets, which differ between encoders and
+    encoder settings even when the other properties match.
+    """
+
+    codec_name: str
+    width: int
+    height: int
+    pix_fmt: Optional[str]
+    profile: Optional[str]
+    frame_rate: Optional[Fraction]
+    extradata: bytes
+
+
+class AudioFormat(NamedTuple):
+    """
+    The properties of a clip's audio stream that must match for clips to be
+    concatenated without re-encoding.
+    """
+
+    codec_name: str
+    sample_rate: int
+    channels: int
+
+
+class ClipFormat(NamedTuple):
+    """
+    The formats of a clip's video and audio streams.
+    """
+
+    video: VideoFormat
+    audio: AudioFormat
+
+
+def probe_video(video_path: str) -> Tuple[str, float]:
+    """
+    Read the codec and duration of a video file's first video stream without decoding it.
+
+    Args:
+        video_path (str): The path of the video file.
+
+    Returns:
+        Tuple[str, float]: The codec name and the duration in seconds.
+    """
+    with av.open(video_path) as container:
+        stream = container.streams.video[0]
+        if stream.duration is not None and stream.time_base is not None:
+            duration = float(stream.duration * stream.time_base)
+        else:
+            # WebM recordings only store the duration on the container
+            duration = float((container.duration or 0) / av.time_base)
+        return stream.codec_context.name, duration
+
+
+def probe_format(clip_path: str) -> ClipFormat:
+    """
+    Read the format of an MP4 clip's first video and audio streams without decoding
+    them.
+
+    Args:
+        clip_path (str): The path of the MP4 clip.
+
+    Returns:
+        ClipFormat: The formats of the video and audio streams.
+    """
+    with av.open(clip_path) as container:
+        stream = container.streams.video[0]
+        codec_context = stream.codec_context
+        audio_context = container.streams.audio[0].codec_context
+        return ClipFormat(
+            video=VideoFormat(
+                codec_name=codec_context.name,
+                width=codec_context.width,
+                height=codec_context.height,
+                pix_fmt=codec_context.pix_fmt,
+                profile=codec_context.profile,
+                frame_rate=stream.average_rate,
+                extradata=bytes(codec_context.extradata or b""),
+            ),
+            audio=AudioFormat(
+                codec_name=audio_context.name,
+                sample_rate=audio_context.sample_rate,
+                channels=audio_context.channels,
+            ),
+        )
+
+
+def encoder_args(video_filter: str) -> List[str]:
+    """
+    Get the ffmpeg arguments that encode a clip's video.
+
+    Every re-encoded clip uses the same encoder settings, so clips of the same frame
+    size share their H.264 parameter sets and can be concatenated without re-encoding.
+
+    Args:
+        video_filter (str): The filters applied to the video before encoding.
+
+    Returns:
+        List[str]: The ffmpeg output arguments for the video stream.
+    """
+    return [
+        "-vf",
+        f"{video_filter},setsar=1",
+        "-c:v",
+        "libx264",
+        "-preset",
+        ENCODER_PRESET,
+        "-profile:v",
+        "high",
+        "-r",
+        str(VIDEO_FRAME_RATE),
+        "-pix_fmt",
+        "yuv420p",
+        "-colorspace",
+        "bt709",
+        "-color_primaries",
+        "bt709",
+        "-color_trc",
+        "bt709",
+        "-color_range",
+        "tv",
+    ]
+
+
+def audio_encoder_args() -> List[str]:
+    """
+    Get the ffmpeg arguments that encode a clip's audio.
+
+    Muxed and re-encoded clips share this audio format, so their audio can be
+    concatenated without re-encoding.
+
+    Returns:
+        List[str]: The ffmpeg output arguments for the audio stream.
+    """
+    return ["-c:a", "aac", "-ar", str(AUDIO_SAMPLE_RATE), "-ac", "2"]
+
+
+def mux_clip(
+    video_path: str, audio_path: str, duration: float, output_dir: Optional[str] = None
+) -> str:
+    """
+    Combine a video file and an audio file into an MP4 clip using ffmpeg.
+
+    H.264 video that is at least `duration` long is copied without re-encoding. Any
+    other video is encoded to H.264, and its last frame is held until the clip
+    reaches `duration`.
+
+    Args:
+        video_path (str): The path of the video file.
+        audio_path (str): The path of the audio file.
+        duration (float): The duration of the clip in seconds.
+        output_dir (Optional[str]): The directory to write the clip to
+            (default is the system temporary directory).
+
+    Returns:
+        str: The path of the MP4 clip.
+    """
+    codec_name, video_duration = probe_video(video_path)
+    copy_video = codec_name == "h264" and video_duration >= duration
+
+    with tempfile.NamedTemporaryFile(
+        suffix=".mp4", dir=output_dir, delete=False
+    ) as temp_mp4:
+        clip_path = temp_mp4.name
+
+    if copy_video:
+        video_args = ["-c:v", "copy"]
+    else:
+        # libx264 needs an even frame size
+        video_args = encoder_args(
+            f"tpad=stop_mode=clone:stop_duration={duration},"
+            f"scale=trunc(iw/2)*2:trunc(ih/2)*2:{COLOR_FILTER}"
+        )
+
+    subprocess.run(
+        [
+            "ffmpeg",
+            "-y",
+            "-loglevel",
+            "error",
+            "-i",
+            video_path,
+            "-i",
+            audio_path,
+            "-map",
+            "0:v:0",
+            "-map",
+            "1:a:0",
+            *video_args,
+            *audio_encoder_args(),
+            "-t",
+            str(duration),
+            clip_path,
+        ],
+        check=True,
+    )
+    return clip_path
+
+
+def encode_clip(
+    clip_path: str,
+    width: int,
+    height: int,
+    output_dir: Optional[str] = None,
+    copy_video: bool = False,
+) -> str:
+    """
+    Re-encode an MP4 clip to the given frame size and to the audio format of muxed
+    clips using ffmpeg. The video is scaled to fit and padded.
+
+    Args:
+        clip_path (str): The path of the MP4 clip, as produced by `mux_clip`.
+        width (int): The frame width in pixels, which must be even.
+        height (int): The frame height in pixels, which must be even.
+        output_dir (Optional[str]): The directory to write the clip to
+            (default is the system temporary directory).
+        copy_video (bool): Whether to copy the video and only re-encode the audio,
+            for clips whose video already has the target format (default is False).
+
+    Returns:
+        str: The path of the re-encoded MP4 clip.
+    """
+    with tempfile.NamedTemporaryFile(
+        suffix=".mp4", dir=output_dir, delete=False
+    ) as temp_mp4:
+        encoded_path = temp_mp4.name
+
+    if copy_video:
+        video_args = ["-c:v", "copy"]
+    else:
+        video_args = encoder_args(
+            f"scale={width}:{height}:force_original_aspect_ratio=decrease:"
+            f"{COLOR_FILTER},pad={width}:{height}:(ow-iw)/2:(oh-ih)/2"
+        )
+    subprocess.run(
+        [
+            "ffmpeg",
+            "-y",
+            "-loglevel",
+            "error",
+            "-i",
+            clip_path,
+            "-map",
+            "0:v:0",
+            "-map",
+            "0:a:0",
+            *video_args,
+            *audio_encoder_args(),
+            encoded_path,
+        ],
+        check=True,
+    )
+    return encoded_path
+
+
+class ClipFiles(NamedTuple):
+    """
+    A video file and its narration audio file, to be muxed into a clip.
+    """
+
+    video_path: str
+    audio_path: str
+    duration: float
+
+
+class PreparedClip(NamedTuple):
+    """
+    An MP4 clip ready to be concatenated, whether tutgen encoded its video, and its
+    expected duration in seconds.
+    """
+
+    clip_path: str
+    encoded: bool
+    duration: float
+
 
 class VideoReceiver:
     """
@@ -36,54 +343,188 @@ class VideoReceiver:
         Initializes a new VideoReceiver.
 
         Attributes:
-            final_video (VideoFileClip or None): The final concatenated video clip.
+            clips (List[Union[str, ClipFiles]]): The MP4 clip paths and the files still
+                to be muxed, in playback order.
+            temp_dir (TemporaryDirectory): Directory for intermediate files, removed when
+                the receiver is garbage collected.
             logger (Logger): The logger for this class.
         """
-        self.final_video = None
+        self.clips: List[Union[str, ClipFiles]] = []
+        self.temp_dir = tempfile.TemporaryDirectory(prefix="tutgen_")
         self.logger = LoggingManager(__name__).logger
 
-    def add_clip(self, clip: VideoFileClip):
+    def make_temp_dir(self) -> str:
         """
-        Concatenates the current VideoFileClip with the clip provided as an argument
-        and overwrites the current VideoFileClip.
+        Creates a directory for a command's intermediate files, which lives as long as
+        the receiver.
+
+        Returns:
+            str: The path of the new directory.
+        """
+        return tempfile.mkdtemp(dir=self.temp_dir.name)
+
+    def add_clip(self, clip_path: str):
+        """
+        Appends an MP4 clip to the final video.
 
         Args:
-            clip (VideoFileClip): The VideoFileClip to be concatenated.
+            clip_path (str): The path of the MP4 clip, as produced by `mux_clip`.
         """
-        assert clip.audio, "Audio is required for video concatenation."
-        assert (
-            clip.duration == clip.audio.duration
-        ), "Audio and video durations must match."
-        if self.final_video is None:
-            self.logger.debug("Adding first clip!")
-            self.final_video = clip
-        else:
-            self.logger.debug("Adding next clip!")
-            assert self.final_video, "self.final_video is undefined."
-            assert self.final_video.audio, "self.final_video has no audio."
-            check_video_duration = self.final_video.duration + clip.duration
-            check_audio_duration = self.final_video.audio.duration + clip.audio.duration
-            self.final_video = concatenate_videoclips([self.final_video, clip])
-            assert self.final_video, "self.final_video is undefined."
-            assert self.final_video.audio, "self.final_video has no audio."
-            assert (
-                check_video_duration == self.final_video.duration
-            ), "Video durations do not match."
-            assert (
-                check_video_duration == check_audio_duration
-            ), "Video and audio durations do not match."
-            assert (
-                check_audio_duration == self.final_video.audio.duration
-            ), "Audio durations do not match."
+        self.logger.debug("Adding clip %s", clip_path)
+        self.clips.append(clip_path)
+
+    def add_clip_files(self, video_path: str, audio_path: str, duration: float):
+        """
+        Appends a video file and its narration audio file to the final video. They are
+        muxed into a clip when the final video is dumped, so both files must exist until
+        then.
+
+        Args:
+            video_path (str): The path of the video file.
+            audio_path (str): The path of the audio file.
+            duration (float): The duration of the clip in seconds.
+        """
+        self.logger.debug("Adding clip files %s, %s", video_path, audio_path)
+        self.clips.append(ClipFiles(video_path, audio_path, duration))
+
+    def prepare_clip(self, clip: Union[str, ClipFiles]) -> PreparedClip:
+        """
+        Get an H.264 MP4 clip.
+
+        Pending files are muxed, and added clips whose video is not H.264 are re-encoded.
+
+        Args:
+            clip (Union[str, ClipFiles]): The MP4 clip path or the files to mux.
+
+        Returns:
+            PreparedClip: The MP4 clip.
+        """
+        if isinstance(clip, ClipFiles):
+            codec_name, video_duration = probe_video(clip.video_path)
+            clip_path = mux_clip(*clip, output_dir=self.temp_dir.name)
+            # mux_clip only copies H.264 video that covers the whole clip
+            encoded = codec_name != "h264" or video_duration < clip.duration
+            return PreparedClip(clip_path, encoded, clip.duration)
+        codec_name, duration = probe_video(clip)
+        if codec_name != "h264":
+            self.logger.debug("Re-encoding %s clip %s", codec_name, clip)
+            clip_path = mux_clip(clip, clip, duration, output_dir=self.temp_dir.name)
+            return PreparedClip(clip_path, True, duration)
+        return PreparedClip(clip, False, duration)
+
+    def conform_clips(
+        self, executor: ThreadPoolExecutor, clips: List[PreparedClip]
+    ) -> List[str]:
+        """
+        Get MP4 clips that can be concatenated without re-encoding.
+
+        When the clips' formats differ, every clip that does not match the format
+        tutgen's encoders produce at the first clip's frame size is re-encoded to it.
+        The audio of every muxed or re-encoded clip is AAC at 44.1 kHz in stereo, and
+        clips whose video already matches only have their audio re-encoded.
+
+        Args:
+            executor (ThreadPoolExecutor): The executor that re-encodes the clips.
+            clips (List[PreparedClip]): The clips, in playback order.
+
+        Returns:
+            List[str]: The paths of the MP4 clips, in playback order.
+        """
+        clip_paths = [clip.clip_path for clip in clips]
+        formats = list(executor.map(probe_format, clip_paths))
+        if len(set(formats)) == 1:
+            return clip_paths
+
+        width, height = formats[0].video.width, formats[0].video.height
+        self.logger.debug("Clip formats differ, re-encoding to %dx%d", width, height)
+        target = next(
+            (
+                clip_format
+                for clip, clip_format in zip(clips, formats)
+                if clip.encoded
+                and (clip_format.video.width, clip_format.video.height)
+                == (width, height)
+            ),
+            None,
+        )
+        if target is None:
+            clip_paths[0] = encode_clip(
+                clip_paths[0], width, height, output_dir=self.temp_dir.name
+            )
+            formats[0] = target = probe_format(clip_paths[0])
+
+        def conform_clip(clip_path: str, clip_format: ClipFormat) -> str:
+            if clip_format == target:
+                return clip_path
+            return encode_clip(
+                clip_path,
+                width,
+                height,
+                output_dir=self.temp_dir.name,
+                copy_video=clip_format.video == target.video,
+            )
+
+        return list(executor.map(conform_clip, clip_paths, formats))
 
     def dump_file(self, output_filename="output.mp4"):
         """
-        Saves the full movie to an mp4 file using write_videofile.
+        Saves the full movie to an mp4 file using ffmpeg's concat demuxer. Clips that
+        still need muxing are muxed concurrently first, and clips whose formats differ
+        are re-encoded to a common format.
+
+        ffmpeg writes the output file in place, so there is no staged copy of the final
+        video to move or copy afterwards. A warning is logged if the final video's
+        duration differs from the total duration of its clips.
 
         Args:
             output_filename (str): The name of the output video file.
         """
-        if self.final_video is not None:
-            self.final_video.write_videofile(output_filename)
-        else:
+        clips = self.clips
+        if not clips:
             self.logger.debug("No clips to dump. Please add clips first.")
+            return
+
+        with ThreadPoolExecutor(max_workers=MAX_MUX_WORKERS) as executor:
+            prepared_clips = list(executor.map(self.prepare_clip, clips))
+            clip_paths = self.conform_clips(executor, prepared_clips)
+        expected_duration = sum(clip.duration for clip in prepared_clips)
+        self.logger.debug(
+            "Concatenating %d clips, %.2f seconds in total",
+            len(clips),
+            expected_duration,
+        )
+
+        concat_list_name = os.path.join(self.temp_dir.name, "concat.txt")
+        with open(concat_list_name, "w", encoding="utf-8") as concat_list:
+            for clip_path in clip_paths:
+                # Paths in the list are relative to the list, and quotes are escaped
+                quoted_path = os.path.abspath(clip_path).replace("'", "'\\''")
+                concat_list.write(f"file '{quoted_path}'\n")
+
+        subprocess.run(
+            [
+                "ffmpeg",
+                "-y",
+                "-loglevel",
+                "error",
+                "-f",
+                "concat",
+                "-safe",
+                "0",
+                "-i",
+                concat_list_name,
+                "-c",
+                "copy",
+                "-movflags",
+                "+faststart",
+                output_filename,
+            ],
+            check=True,
+        )
+        dumped_duration = probe_video(output_filename)[1]
+        if abs(dumped_duration - expected_duration) > DURATION_TOLERANCE * len(clips):
+            self.logger.warning(
+                "Dumped %.2f seconds of video, expected %.2f seconds",
+                dumped_duration,
+                expected_duration,
+            )